@@ -0,0 +1,127 @@
+import json
+import time
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib import parse
+import numpy as np
+import pandas as pd
+
+
+# Records of one endpoint sorted by time, serialized once and sliced per request
+class _Table(object):
+
+    def __init__(self, records: pd.DataFrame, key: str = None) -> None:
+        records = records.astype('object').where(records.notnull(), None)
+        self.times = np.array([datetime.fromisoformat(t).timestamp() for t in records['time']])
+        order = np.argsort(self.times, kind='stable')
+        self.times = self.times[order]
+        self.rows = np.array([json.dumps(r) for r in records.iloc[order].to_dict('records')], dtype='object')
+        self.keys = records[key].to_numpy()[order] if key else None
+
+    # Newest records first inside [start_time, end_time], both inclusive and to the microsecond
+    def page(self, start_time: float, end_time: float, limit: int, key: str = None) -> List[str]:
+        first = np.searchsorted(self.times, start_time, side='left') if start_time is not None else 0
+        last = np.searchsorted(self.times, end_time, side='right') if end_time is not None else len(self.times)
+        rows, keys = self.rows[first:last][::-1], None if self.keys is None else self.keys[first:last][::-1]
+        if key is not None:
+            rows = rows[keys == key]
+        return list(rows[:limit])
+
+
+# Local stand-in for the FTX REST API serving /fills, /funding_payments, /positions and /markets
+# Paginates like the real API, can add latency to every request and answer every nth request with a 429
+# Faults can be injected: every error_every-th request gets a 502 with an HTML body, every unavailable_every-th one a 503 with a JSON error
+# and every stall_every-th one is held for stall seconds
+class MockExchange(object):
+
+    def __init__(self, fills: pd.DataFrame, funding: pd.DataFrame, positions: pd.DataFrame, markets: List[Dict] = None, latency: float = 0.0,
+                 rate_limit_every: int = 0, error_every: int = 0, stall_every: int = 0, stall: float = 0.0, unavailable_every: int = 0) -> None:
+        self._fills = _Table(fills, 'market')
+        self._funding = _Table(funding, 'future')
+        self._positions = json.dumps(positions.astype('object').where(positions.notnull(), None).to_dict('records'))
+        self._markets = json.dumps(markets or [{'name': m} for m in pd.unique(fills['market'])])
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.error_every = error_every
+        self.unavailable_every = unavailable_every
+        self.stall_every = stall_every
+        self.stall = stall
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/api/'
+
+    def start(self) -> str:
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                status, body = exchange._handle(self.path)
+                payload = body.encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json' if status != 502 else 'text/html')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                # The client timed out on a stalled request
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handle(self, path: str):
+        with self._lock:
+            self.requests += 1
+            throttled = self.rate_limit_every and self.requests % self.rate_limit_every == 0
+            failed = self.error_every and self.requests % self.error_every == 0
+            unavailable = self.unavailable_every and self.requests % self.unavailable_every == 0
+            stalled = self.stall_every and self.requests % self.stall_every == 0
+        if self.latency:
+            time.sleep(self.latency)
+        if stalled:
+            time.sleep(self.stall)
+        if throttled:
+            return 429, json.dumps({'success': False, 'error': 'Do not send more than 30 requests per second'})
+        if failed:
+            return 502, '<html><body><h1>502 Bad Gateway</h1></body></html>'
+        if unavailable:
+            return 503, json.dumps({'success': False, 'error': 'Please retry request'})
+
+        url = parse.urlsplit(path)
+        endpoint = url.path.rsplit('/', 1)[-1]
+        params = dict(parse.parse_qsl(url.query))
+        start_time = float(params['start_time']) if 'start_time' in params else None
+        end_time = float(params['end_time']) if 'end_time' in params else None
+
+        if endpoint == 'fills':
+            result = '[' + ','.join(self._fills.page(start_time, end_time, int(params.get('limit', 20)), params.get('market'))) + ']'
+        elif endpoint == 'funding_payments':
+            result = '[' + ','.join(self._funding.page(start_time, end_time, 100, params.get('future'))) + ']'
+        elif endpoint == 'positions':
+            result = self._positions
+        elif endpoint == 'markets':
+            result = self._markets
+        else:
+            return 404, json.dumps({'success': False, 'error': 'Not Found'})
+
+        body = '{"success": true, "result": ' + result + '}'
+        with self._lock:
+            self.bytes_sent += len(body)
+        return 200, body
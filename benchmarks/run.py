@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+import pandas as pd
+from requests import Response
+from requests.adapters import HTTPAdapter
+from ftx.clients.rest_client import FtxAuth, FtxClient
+from ftx.clients.rate_limit import RateLimiter
+from ftx.data._wranglers import add_trades, preprocess_fills, preprocess_funding
+from ftx.data.fetch import _positions_frame
+from ftx.data.process import attribute_funding, get_futures_summary, get_futures_trades_by_market, get_spot_summary, _trades_table
+from benchmarks.mock_server import MockExchange
+from benchmarks.synthetic import synthetic_fills, synthetic_funding, synthetic_positions
+
+# A stage slower than this fraction over the previous run with the same parameters is reported
+_REGRESSION = 0.2
+
+
+def timed(function: Callable, *args, repeat: int = 3, **kwargs) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Fetches every fill and funding payment from a local mock exchange, the limiter is loose enough to never wait
+def bench_paginate(fills: pd.DataFrame, funding: pd.DataFrame, positions: pd.DataFrame, latency: float, rate_limit_every: int) -> Dict[str, float]:
+    exchange = MockExchange(fills, funding, positions, latency=latency, rate_limit_every=rate_limit_every)
+    client = FtxClient(FtxAuth(), RateLimiter(rate=1e6, burst=1000))
+    client._ROOT = exchange.start()
+    try:
+        results = {
+            'get_all_fills': timed(client.get_all_fills, repeat=1),
+            'get_all_funding_payments': timed(client.get_all_funding_payments, repeat=1),
+        }
+        results['requests'] = exchange.requests
+        results['bytes'] = exchange.bytes_sent
+        return results
+    finally:
+        exchange.stop()
+
+
+# Answers every request with the same body without touching the network
+class _CannedAdapter(HTTPAdapter):
+
+    def __init__(self, body: bytes) -> None:
+        super().__init__()
+        self._body = body
+
+    def send(self, request, **kwargs) -> Response:
+        response = Response()
+        response.status_code = 200
+        response._content = self._body
+        response.request = request
+        response.url = request.url
+        return response
+
+
+# Client side CPU time of one request: building, signing, rate limiting and decoding a page of 100 fills
+def bench_request_overhead(fills: pd.DataFrame, requests: int = 2000) -> Dict[str, float]:
+    page = fills.iloc[:100].astype('object').where(fills.iloc[:100].notnull(), None).to_dict('records')
+    client = FtxClient(FtxAuth('key', 'secret', 'subaccount'), RateLimiter(rate=1e9, burst=requests))
+    client._session.mount(client._ROOT, _CannedAdapter(json.dumps({'success': True, 'result': page}).encode()))
+    start = time.process_time()
+    for _ in range(requests):
+        client.get_fills(market='BTC-PERP', start_time=1577836800.5, end_time=1609459200.25, limit=100)
+    return {'request_cpu_us': (time.process_time() - start) / requests * 1e6}
+
+
+# Trades are computed lazily per market, every market is accessed
+def _all_trades(futures_by_market: Dict[str, pd.DataFrame], funding: pd.DataFrame, workers: int = 1) -> None:
+    dict(get_futures_trades_by_market(futures_by_market, funding, workers))
+
+
+def bench_processing(fills: pd.DataFrame, funding: pd.DataFrame, positions: pd.DataFrame, repeat: int, workers: int = 1) -> Dict[str, float]:
+    spot, futures, futures_by_market, _ = preprocess_fills(fills)
+    funding = preprocess_funding(funding.copy())
+    positions = _positions_frame(positions.to_dict('records'))
+    biggest = max(futures_by_market.values(), key=len)
+    trades = _trades_table(add_trades(biggest))
+    biggest_funding = funding[funding['future'] == biggest['market'].iloc[0]]
+
+    results = {
+        'preprocess_fills': timed(preprocess_fills, fills, repeat=repeat),
+        'preprocess_fills_fixed': timed(preprocess_fills, fills, True, repeat=repeat),
+        'add_trades': timed(add_trades, biggest, repeat=repeat),
+        'get_futures_summary': timed(get_futures_summary, futures, funding, positions, repeat=repeat),
+        'get_spot_summary': timed(get_spot_summary, spot, repeat=repeat),
+        'get_futures_trades_by_market': timed(_all_trades, futures_by_market, funding, repeat=repeat),
+        'attribute_funding': timed(attribute_funding, trades, biggest_funding, repeat=repeat),
+    }
+    if workers > 1:
+        results['get_futures_trades_by_market_parallel'] = timed(_all_trades, futures_by_market, funding, workers, repeat=repeat)
+    return results
+
+
+# Summaries over growing numbers of fills and markets, keyed by stage and size, ie get_futures_summary_100000x100
+def bench_summary_scaling(repeat: int, sizes=(10_000, 100_000, 1_000_000), market_counts=(10, 100, 1000)) -> Dict[str, float]:
+    results = {}
+    for n_fills in sizes:
+        for n_markets in market_counts:
+            fills = synthetic_fills(n_fills, n_markets)
+            spot, futures, _, _ = preprocess_fills(fills)
+            markets = sorted(futures['market'].unique())
+            funding = preprocess_funding(synthetic_funding(markets, days=30))
+            positions = _positions_frame(synthetic_positions(markets[:len(markets) // 2]).to_dict('records'))
+            results[f'get_futures_summary_{n_fills}x{n_markets}'] = timed(get_futures_summary, futures, funding, positions, repeat=repeat)
+            results[f'get_spot_summary_{n_fills}x{n_markets}'] = timed(get_spot_summary, spot, repeat=repeat)
+    return results
+
+
+# Previous result with the same parameters, None on the first run
+def previous_run(path: str, params: Dict) -> Dict:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    runs = [r for r in runs if r['params'] == params]
+    return runs[-1] if runs else None
+
+
+def regressions(current: Dict[str, float], previous: Dict[str, float]) -> List[str]:
+    slower = []
+    for stage, seconds in current.items():
+        before = previous.get(stage)
+        if before and stage not in ('requests', 'bytes') and seconds > before * (1 + _REGRESSION):
+            slower.append(f'{stage}: {before:.4f}s -> {seconds:.4f}s (+{seconds / before - 1:.0%})')
+    return slower
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Times fetching and processing of synthetic account histories')
+    parser.add_argument('--fills', type=int, default=100_000)
+    parser.add_argument('--markets', type=int, default=100)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--fetch-fills', type=int, default=10_000, help='Fills served by the mock exchange, 0 skips the fetch benchmark')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every mock exchange response')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='Answer every nth request with a 429')
+    parser.add_argument('--workers', type=int, default=1, help='Also time trade reconstruction on a process pool of this size')
+    parser.add_argument('--scaling', action='store_true', help='Also time the summaries from 10k to 1M fills over 10 to 1000 markets')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results.jsonl'))
+    args = parser.parse_args(argv)
+
+    params = {k: v for k, v in vars(args).items() if k not in ('repeat', 'output')}
+    fills = synthetic_fills(args.fills, args.markets, days=args.days)
+    markets = sorted(fills['market'].unique())
+    funding = synthetic_funding(markets, days=args.days)
+    positions = synthetic_positions(markets)
+
+    results = bench_processing(fills, funding, positions, args.repeat, args.workers)
+    if args.fetch_fills:
+        # Only the funding paid while the fetched fills were made
+        fetch_fills = fills.iloc[:args.fetch_fills]
+        fetch_markets = sorted(fetch_fills['market'].unique())
+        fetch_funding = funding[funding['future'].isin(fetch_markets) & (funding['time'] <= fetch_fills['time'].iloc[-1])]
+        results.update(bench_paginate(fetch_fills, fetch_funding, synthetic_positions(fetch_markets), args.latency, args.rate_limit_every))
+    results.update(bench_request_overhead(fills))
+    if args.scaling:
+        results.update(bench_summary_scaling(args.repeat))
+
+    for stage, value in results.items():
+        print(f'{stage:<30} {value:>12.4f}' if isinstance(value, float) else f'{stage:<30} {value:>12}')
+
+    previous = previous_run(args.output, params)
+    slower = regressions(results, previous['results']) if previous else []
+    for line in slower:
+        print(f'REGRESSION {line}')
+
+    run = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'params': params,
+        'results': results,
+    }
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(run) + '\n')
+    return 1 if slower else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
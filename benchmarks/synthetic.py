@@ -0,0 +1,96 @@
+from typing import List
+import numpy as np
+import pandas as pd
+import ftx.data._precisions as prec
+from ftx.data.fetch import _FILLS, _FUNDING, _OPEN_POSITIONS
+
+_ROOTS = list(prec.FUTURES_SIZE)
+# Perpetuals first, then one dated future per day of the year
+_EXPIRIES = ['PERP'] + [d.strftime('%m%d') for d in pd.date_range('2020-01-01', '2020-12-31')]
+
+
+# Futures market names with a known precision, up to about 20000
+def futures_markets(n: int) -> List[str]:
+    return [f'{root}-{expiry}' for expiry in _EXPIRIES for root in _ROOTS][:n]
+
+
+def spot_markets(n: int) -> List[str]:
+    return [f'{root}/USD' for root in _ROOTS][:n]
+
+
+def _iso_times(seconds: np.ndarray) -> np.ndarray:
+    return np.char.add(np.datetime_as_string((seconds * 1e6).astype('datetime64[us]'), unit='us'), '+00:00')
+
+
+# Raw fills in the /fills format, sorted by time
+# Market activity is skewed so a few markets hold most of the fills like on a real account
+def synthetic_fills(n_fills: int, n_markets: int, spot_fraction: float = 0.1, start: str = '2020-01-01', days: int = 365, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n_spot = min(len(_ROOTS), int(n_markets * spot_fraction))
+    futures = futures_markets(n_markets - n_spot)
+    markets = np.array(futures + spot_markets(n_spot), dtype='object')
+    is_future = np.arange(len(markets)) < len(futures)
+    precision = np.array([prec.FUTURES_SIZE[m.split('-')[0].split('/')[0]] for m in markets])
+    base_price = rng.uniform(1, 10000, len(markets))
+
+    weights = 1 / np.arange(1, len(markets) + 1)
+    market = rng.choice(len(markets), n_fills, p=weights / weights.sum())
+    seconds = np.sort(rng.uniform(0, days * 86400, n_fills)) + pd.Timestamp(start).timestamp()
+    size = np.round(rng.integers(1, 100, n_fills) * 10.0**-precision[market], 8)
+    price = np.round(base_price[market] * rng.uniform(0.9, 1.1, n_fills), 2)
+    maker = rng.random(n_fills) < 0.3
+    fee_rate = np.where(maker, 0.0002, 0.0007)
+    spot_base = np.array([m.split('/')[0] if '/' in m else None for m in markets], dtype='object')
+    ids = np.arange(n_fills) + 10**8
+
+    fills = pd.DataFrame({
+        'fee': size * price * fee_rate,
+        'feeCurrency': 'USD',
+        'feeRate': fee_rate,
+        'future': np.where(is_future[market], markets[market], None),
+        'id': ids,
+        'liquidity': np.where(maker, 'maker', 'taker'),
+        'market': markets[market],
+        'baseCurrency': spot_base[market],
+        'quoteCurrency': np.where(is_future[market], None, 'USD'),
+        'orderId': ids + 10**9,
+        'tradeId': ids + 2 * 10**9,
+        'price': price,
+        'size': size,
+        'side': np.where(rng.random(n_fills) < 0.5, 'buy', 'sell'),
+        'time': _iso_times(seconds),
+        'type': 'order',
+    })
+    return fills[_FILLS]
+
+
+# Hourly funding payments in the /funding_payments format for the perpetuals among the markets
+def synthetic_funding(markets: List[str], start: str = '2020-01-01', days: int = 365, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    perpetuals = [m for m in markets if m.endswith('-PERP')]
+    hours = np.arange(days * 24) * 3600.0 + pd.Timestamp(start).timestamp()
+    future = np.repeat(np.array(perpetuals, dtype='object'), len(hours))
+    seconds = np.tile(hours, len(perpetuals))
+    funding = pd.DataFrame({
+        'future': future,
+        'id': np.arange(len(future)) + 10**8,
+        'payment': rng.normal(0, 0.5, len(future)).round(6),
+        'time': _iso_times(seconds),
+    })
+    return funding.sort_values('time', kind='stable', ignore_index=True)[_FUNDING]
+
+
+# Open positions in the /positions format, one per futures market
+def synthetic_positions(markets: List[str], seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    futures = [m for m in markets if '/' not in m]
+    net_size = rng.normal(0, 10, len(futures)).round(3)
+    entry = rng.uniform(1, 10000, len(futures)).round(2)
+    positions = pd.DataFrame({column: 0.0 for column in _OPEN_POSITIONS}, index=range(len(futures)))
+    positions['future'] = futures
+    positions['netSize'] = net_size
+    positions['size'] = np.abs(net_size)
+    positions['side'] = np.where(net_size < 0, 'sell', 'buy')
+    positions['entryPrice'] = entry
+    positions['cost'] = net_size * entry
+    return positions[_OPEN_POSITIONS]
@@ -0,0 +1,134 @@
+import asyncio
+import weakref
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterable, Tuple
+from requests import HTTPError, ConnectionError, Timeout
+from ftx.clients.rest_client import FtxAuth, FtxClient, PageCursor, PaginationInterrupted, RateLimitError
+from ftx.clients.cache import ResponseCache
+from ftx.clients.rate_limit import RateLimiter
+from ftx.clients.transport import Transport
+from ftx.metrics import Metrics
+
+
+class AsyncFtxClient(object):
+    # Number of requests allowed in flight at the same time
+    _CONCURRENCY = 8
+
+    def __init__(self, auth: FtxAuth = FtxAuth(), concurrency: int = _CONCURRENCY, rate_limiter: RateLimiter = None, metrics: Metrics = None,
+                 cache: ResponseCache = None, transport: Transport = None) -> None:
+        # Requests are signed, rate limited, cached, retried and checked by a regular client, only the blocking I/O is moved off the event loop
+        self._client = FtxClient(auth, rate_limiter, metrics, cache, transport)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._concurrency = concurrency
+        # Event loop -> semaphore, a client can be used by several asyncio.run() calls one after the other
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    @property
+    def auth(self):
+        return self._client.auth
+
+    @auth.setter
+    def auth(self, auth: FtxAuth):
+        self._client.auth = auth
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self._client._session.close()
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._client.rate_limiter
+
+    @property
+    def metrics(self) -> Metrics:
+        return self._client.metrics
+
+    @property
+    def cache(self) -> ResponseCache:
+        return self._client.cache
+
+    def invalidate_cache(self, endpoint: str = None) -> None:
+        self._client.invalidate_cache(endpoint)
+
+    # Runs a signed GET on the executor without blocking the event loop
+    async def _get(self, endpoint: str, params: Dict[str, Any] = None) -> Any:
+        # Asyncio primitives are bound to the loop they are first used in
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self._concurrency)
+        async with self._semaphores[loop]:
+            return await loop.run_in_executor(self._executor, partial(self._client._get, endpoint, params))
+
+    # Same pagination as FtxClient._paginate, awaiting each page instead of blocking
+    @staticmethod
+    async def _paginate(method, *args, **kwargs):
+        return await AsyncFtxClient._collect(method, args, kwargs, PageCursor(kwargs.get('limit') or 100), [])
+
+    # When a request fails for good, resume() of the raised PaginationInterrupted returns a coroutine finishing the pagination
+    @staticmethod
+    async def _collect(method, args: Tuple, kwargs: Dict[str, Any], cursor: PageCursor, results: List[Dict]) -> List[Dict]:
+        while not cursor.done:
+            try:
+                response = await method(*args, **kwargs)
+            except (HTTPError, ConnectionError, Timeout, RateLimitError) as e:
+                raise PaginationInterrupted(f'Pagination interrupted after {cursor.pages} pages: {e}',
+                                            lambda: AsyncFtxClient._collect(method, args, kwargs, cursor, results), results) from e
+            results.extend(cursor.advance(response, kwargs))
+        FtxClient._record_pages(method, cursor)
+        return results
+
+    async def list_futures(self) -> List[Dict]:
+        return await self._get('futures')
+
+    async def list_markets(self) -> List[Dict]:
+        return await self._get('markets')
+
+    async def get_account_info(self) -> Dict:
+        return await self._get('account')
+
+    async def get_subaccounts(self) -> List[Dict]:
+        return await self._get('subaccounts')
+
+    async def get_positions(self, show_avg_price: bool = False) -> List[Dict]:
+        return await self._get('positions', {'showAvgPrice': show_avg_price})
+
+    async def get_fills(self, market: str = None, start_time: float = None, end_time: float = None, limit: int = None) -> List[Dict]:
+        params = {}
+        if market:
+            params['market'] = market
+        if limit:
+            params['limit'] = limit
+        if start_time:
+            params['start_time'] = start_time
+        if end_time:
+            params['end_time'] = end_time
+        return await self._get('fills', params)
+
+    async def get_funding_payments(self, future: str = None, start_time: float = None, end_time: float = None) -> List[Dict]:
+        params = {}
+        if future:
+            params['future'] = future
+        if start_time:
+            params['start_time'] = start_time
+        if end_time:
+            params['end_time'] = end_time
+        return await self._get('funding_payments', params)
+
+    async def get_all_fills(self, market: str = None, start_time: float = None, end_time: float = None) -> List[Dict]:
+        return await AsyncFtxClient._paginate(self.get_fills, market=market, start_time=start_time, end_time=end_time, limit=100)
+
+    async def get_all_funding_payments(self, future: str = None, start_time: float = None, end_time: float = None) -> List[Dict]:
+        return await AsyncFtxClient._paginate(self.get_funding_payments, future=future, start_time=start_time, end_time=end_time)
+
+    # Downloads the fill history of several markets at once, keyed by market
+    async def get_all_fills_by_market(self, markets: Iterable[str], start_time: float = None, end_time: float = None) -> Dict[str, List[Dict]]:
+        markets = list(markets)
+        histories = await asyncio.gather(*(self.get_all_fills(market, start_time, end_time) for market in markets))
+        return dict(zip(markets, histories))
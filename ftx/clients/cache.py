@@ -0,0 +1,114 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+# Seconds a response stays fresh, endpoints not listed are never cached
+DEFAULT_TTLS = {
+    'futures': 300.0,
+    'markets': 300.0,
+    'subaccounts': 300.0,
+    'account': 30.0,
+}
+
+
+# Responses of read-mostly GET endpoints kept for a per endpoint TTL, opt-in through FtxClient(cache=...)
+# Entries are keyed by API key, subaccount, endpoint and params and held as JSON text so callers never share objects
+# Memory holds at most max_entries, least recently used first out, a SQLite file shares entries between processes
+class ResponseCache(object):
+
+    def __init__(self, ttls: Dict[str, float] = None, max_entries: int = 256, path: str = None) -> None:
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (expiry time, endpoint, JSON text)
+        self._entries: 'OrderedDict[str, Tuple[float, str, str]]' = OrderedDict()
+        # endpoint -> [hits, misses]
+        self._counts: Dict[str, list] = {}
+        self._conn = None
+        if path is not None:
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self._conn:
+                self._conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, expires REAL NOT NULL, value TEXT NOT NULL)')
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+
+    def cacheable(self, endpoint: str) -> bool:
+        return endpoint in self.ttls
+
+    # The API key is hashed so it is not written to the shared file in clear
+    @staticmethod
+    def key(api_key: str, subaccount: str, endpoint: str, params: Dict[str, Any] = None) -> str:
+        account = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        return f'{account}|{subaccount}|{endpoint}|{json.dumps(params or {}, sort_keys=True)}'
+
+    # Returns whether the key was fresh and its value
+    def get(self, key: str, endpoint: str) -> Tuple[bool, Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None and self._conn is not None:
+                row = self._conn.execute('SELECT expires, endpoint, value FROM responses WHERE key = ? AND expires > ?', (key, now)).fetchone()
+                if row is not None:
+                    entry = self._store(key, row)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            counts = self._counts.setdefault(endpoint, [0, 0])
+            counts[entry is None] += 1
+        return (False, None) if entry is None else (True, json.loads(entry[2]))
+
+    def put(self, key: str, endpoint: str, value: Any) -> None:
+        entry = (time.time() + self.ttls[endpoint], endpoint, json.dumps(value))
+        with self._lock:
+            self._store(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)', (key, endpoint, entry[0], entry[2]))
+
+    # Drops the entries of an endpoint, every entry if none is given
+    # Other processes sharing the file keep the entries already in their memory until they expire
+    def invalidate(self, endpoint: str = None) -> None:
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+            else:
+                for key in [k for k, e in self._entries.items() if e[1] == endpoint]:
+                    del self._entries[key]
+            if self._conn is not None:
+                with self._conn:
+                    if endpoint is None:
+                        self._conn.execute('DELETE FROM responses')
+                    else:
+                        self._conn.execute('DELETE FROM responses WHERE endpoint = ?', (endpoint, ))
+
+    # Hits and misses per endpoint
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {endpoint: {'hits': c[0], 'misses': c[1]} for endpoint, c in self._counts.items()}
+
+    @property
+    def hits(self) -> int:
+        return sum(s['hits'] for s in self.stats().values())
+
+    @property
+    def misses(self) -> int:
+        return sum(s['misses'] for s in self.stats().values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Called with the lock held
+    def _store(self, key: str, entry: Tuple[float, str, str]) -> Tuple[float, str, str]:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        return entry
@@ -0,0 +1,73 @@
+import time
+import threading
+from typing import Dict
+
+
+class RateLimiter(object):
+    # Shared limiters, one per API key
+    _shared: Dict[str, 'RateLimiter'] = {}
+    _shared_lock = threading.Lock()
+
+    # FTX allows 30 requests / second per API key
+    def __init__(self, rate: float = 30.0, burst: int = 1, min_rate: float = 1.0, max_backoff: float = 30.0) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._min_rate = min_rate
+        self._max_backoff = max_backoff
+        # Rate currently in effect, lowered after 429s and recovered on successful requests
+        self._current_rate = rate
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._backoff = 0.0
+        self._lock = threading.Lock()
+
+    # Returns the limiter shared by every client using the same API key
+    @classmethod
+    def for_key(cls, key: str, **kwargs) -> 'RateLimiter':
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(**kwargs)
+            return cls._shared[key]
+
+    @property
+    def rate(self) -> float:
+        return self._current_rate
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._current_rate)
+        self._updated = now
+
+    # Blocks until a request may be sent, returns the time spent waiting
+    def acquire(self) -> float:
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    wait = (1 - self._tokens) / self._current_rate
+            time.sleep(wait)
+            waited += wait
+
+    # Called when the server throttled a request
+    # Halves the rate and pauses every caller for an exponentially growing period
+    def backoff(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._current_rate = max(self._min_rate, self._current_rate / 2)
+            self._backoff = min(self._max_backoff, self._backoff * 2 or 1 / self._current_rate)
+            self._blocked_until = max(self._blocked_until, now + self._backoff)
+            self._tokens = 0.0
+            self._updated = now
+
+    # Called after every accepted request, slowly climbs back to the configured rate
+    def success(self) -> None:
+        with self._lock:
+            if self._current_rate < self._rate:
+                self._current_rate = min(self._rate, self._current_rate + 1 / self._current_rate)
+            self._backoff = 0.0
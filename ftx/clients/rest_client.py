@@ -1,9 +1,20 @@
+import hashlib
 import hmac
+import json
 import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from urllib import parse
-from typing import Dict, List, Tuple, Any
-from requests import Request, Session, Response, HTTPError, PreparedRequest
+from typing import Dict, List, Tuple, Any, Iterator
+from requests import Request, Session, Response, HTTPError, PreparedRequest, ConnectionError, Timeout
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import resolve_proxies
+from ftx.clients.cache import ResponseCache
+from ftx.clients.rate_limit import RateLimiter
+from ftx.clients.transport import Transport, json_loads
+from ftx.metrics import Metrics
 
 
 class ApiError(Exception):
@@ -14,17 +25,62 @@ class AuthError(ApiError):
     pass
 
 
+class RateLimitError(ApiError):
+    pass
+
+
+# Raised when a pagination stops on a request that failed after every retry
+# resume() continues from the last page received, records already downloaded are not requested again
+class PaginationInterrupted(ApiError):
+
+    def __init__(self, message: str, resume, results: List[Dict] = None) -> None:
+        super().__init__(message)
+        self._resume = resume
+        # Records downloaded before the failure, the same list keeps growing when resumed
+        self.results = results
+
+    # Returns what the interrupted call would have returned, raises PaginationInterrupted again if the next request fails
+    def resume(self):
+        return self._resume()
+
+
 class FtxAuth(object):
     def __init__(self, key: str = '', secret: str = '', subaccount: str = '') -> None:
         self._key = key
         self._secret = secret
         self._subaccount = subaccount
+        # Keyed once, every signature starts from a copy
+        self._hmac = hmac.new(secret.encode(), digestmod='sha256')
+        # Headers every signed request carries besides the signature and its timestamp
+        self._headers = {'FTX-KEY': key}
+        if subaccount:
+            self._headers['FTX-SUBACCOUNT'] = parse.quote(subaccount)
+
+    @property
+    def subaccount(self) -> str:
+        return self._subaccount
+
+    # Identifies the account of the API key without exposing the key
+    @property
+    def key_id(self) -> str:
+        return hashlib.sha256(self._key.encode()).hexdigest()[:16]
+
+    # Same credentials signing for another subaccount, '' is the main account
+    def for_subaccount(self, subaccount: str) -> 'FtxAuth':
+        return FtxAuth(self._key, self._secret, subaccount)
 
     # Signs encoded payloads and returns milisecond timestamp and signature
     def get_signature(self, payload: bytes) -> Tuple[str, str]:
         # Timestamp in miliseconds
         timestamp = str(int(time.time() * 1000))
-        return timestamp, hmac.new(self._secret.encode(), timestamp.encode() + payload, 'sha256').hexdigest()
+        signature = self._hmac.copy()
+        signature.update(timestamp.encode() + payload)
+        return timestamp, signature.hexdigest()
+
+    # Authentication headers of a request, payload is the method, path with query and body
+    def signed_headers(self, payload: bytes) -> Dict[str, str]:
+        timestamp, signature = self.get_signature(payload)
+        return {**self._headers, 'FTX-SIGN': signature, 'FTX-TS': timestamp}
 
     # Takes a Request and returns a PreparedRequest with appropriate headers
     def sign_http_request(self, request: Request) -> PreparedRequest:
@@ -33,30 +89,95 @@ class FtxAuth(object):
         # POST requests will have serialized JSON as body, encode payload before appending
         if prepared.body:
             http_payload += prepared.body
-        timestamp, signature = self.get_signature(http_payload)
-        prepared.headers['FTX-KEY'] = self._key
-        prepared.headers['FTX-SIGN'] = signature
-        prepared.headers['FTX-TS'] = timestamp
-        if self._subaccount:
-            prepared.headers['FTX-SUBACCOUNT'] = parse.quote(self._subaccount)
+        prepared.headers.update(self.signed_headers(http_payload))
         return prepared
 
     # Returns a ws authentication message
     def sign_ws_message(self) -> str:
-        pass
+        timestamp, signature = self.get_signature(b'websocket_login')
+        args = {'key': self._key, 'sign': signature, 'time': int(timestamp)}
+        if self._subaccount:
+            args['subaccount'] = self._subaccount
+        return json.dumps({'op': 'login', 'args': args})
 
     def __repr__(self) -> str:
         return f'key:{self._key} secret:{self._secret} {self._subaccount}'
 
 
+# Pagination state shared by the sync and async clients
+# Pages are requested backwards in time by moving 'end_time' to the exact timestamp of the oldest record received
+# Only records on that timestamp are returned again, their ids are kept to drop them
+class PageCursor(object):
+    # Largest page requested when records sharing one timestamp do not fit in a page
+    MAX_LIMIT = 5000
+
+    def __init__(self, limit: int, max_limit: int = MAX_LIMIT) -> None:
+        self.limit = limit
+        self.max_limit = max_limit
+        self.done = False
+        self.pages = 0
+        self.duplicates = 0
+        # Requests sent again with a larger page
+        self.widened = 0
+        self._boundary = None
+        # Ids of records on the boundary timestamp
+        self._seen = set()
+
+    # Drops records returned by a previous page and moves 'end_time' in kwargs for the next request
+    def advance(self, response: List[Dict], kwargs: Dict[str, Any]) -> List[Dict]:
+        page = [r for r in response if r['id'] not in self._seen]
+        self.pages += 1
+        self.duplicates += len(response) - len(page)
+        limit = kwargs.get('limit') or self.limit
+        if len(response) < limit:
+            self.done = True
+            return page
+
+        # /funding_payments takes no limit, a full page of known payments can not be advanced past
+        if not page and ('limit' not in kwargs or limit >= self.max_limit):
+            raise ApiError(f'More than {limit} records at timestamp {self._boundary}, pagination can not advance')
+
+        times = [datetime.fromisoformat(r['time']).timestamp() for r in response]
+        boundary = min(times)
+        if self._boundary is not None and boundary < self._boundary:
+            self._seen.clear()
+            if 'limit' in kwargs:
+                kwargs['limit'] = self.limit
+        self._boundary = boundary
+        self._seen.update(r['id'] for r, t in zip(response, times) if t == boundary)
+        kwargs['end_time'] = boundary
+        # A full page on a single timestamp would be followed by the same records, the next page is made larger instead
+        if boundary == max(times) and 'limit' in kwargs and limit < self.max_limit:
+            kwargs['limit'] = min(limit * 2, self.max_limit)
+            self.widened += 1
+        return page
+
+
 class FtxClient(object):
     _ROOT = 'https://ftx.com/api/'
-    # Rate limit 30 requests / second
-    _RATELIMIT = 0.035
-
-    def __init__(self, auth: FtxAuth = FtxAuth()) -> None:
-        self._session = Session()
+    # Attempts made for a request that keeps getting rate limited
+    _RATELIMIT_RETRIES = 5
+    # API endpoint of each paginated method, pagination metrics share the endpoint label of request metrics
+    _PAGINATED_ENDPOINTS = {'get_fills': 'fills', 'get_funding_payments': 'funding_payments'}
+
+    # Clients using the same API key share a rate limiter unless one is passed explicitly
+    # Requests and paginations are recorded into metrics when one is passed
+    # With a cache, GET endpoints it has a TTL for are answered from it while fresh
+    # The transport sets timeouts, retries of failed GET requests and hedging
+    def __init__(self, auth: FtxAuth = FtxAuth(), rate_limiter: RateLimiter = None, metrics: Metrics = None, cache: ResponseCache = None,
+                 transport: Transport = None) -> None:
         self.auth = auth
+        self.rate_limiter = rate_limiter or RateLimiter.for_key(auth._key)
+        self.metrics = metrics
+        self.cache = cache
+        self.transport = transport or Transport()
+        # Keep-alive connections for every thread that can send at once, retries are handled by the client
+        self._session = Session()
+        adapter = HTTPAdapter(pool_maxsize=self.transport.pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        # Root URL -> path of the root and proxies for its host, looked up once instead of on every request
+        self._roots: Dict[str, Tuple[str, Dict[str, str]]] = {}
 
     @property
     def auth(self):
@@ -68,58 +189,186 @@ class FtxClient(object):
             raise ValueError(f'auth is not {FtxAuth} type: {type(auth)}')
         self._auth = auth
 
-    # Creates and signs a Request to be sent to the server
+    # Builds the same signed request as Request.prepare() and FtxAuth.sign_http_request, without parsing the URL again
+    # Every attempt goes through here so each one carries a fresh FTX-TS
     def _request(self, method: str, endpoint: str, params: Dict) -> Response:
-        req = Request(method, f'{FtxClient._ROOT}{endpoint}', params=params)
-        signed = self._auth.sign_http_request(req)
-        return self._session.send(signed)
+        root = self._ROOT
+        if root not in self._roots:
+            path = parse.urlsplit(root).path
+            self._roots[root] = path, resolve_proxies(Request('GET', root).prepare(), self._session.proxies, self._session.trust_env)
+        path, proxies = self._roots[root]
+        query = parse.urlencode([(k, v) for k, v in params.items() if v is not None]) if params else ''
+        target = f'{endpoint}?{query}' if query else endpoint
+
+        # Signed once the limiter lets the request go, a long backoff would otherwise leave it with a stale FTX-TS
+        waited = self.rate_limiter.acquire()
+        signed = PreparedRequest()
+        signed.method = method
+        signed.url = f'{root}{target}'
+        signed.headers = CaseInsensitiveDict(self._auth.signed_headers(f'{method}{path}{target}'.encode()))
+        if self.metrics is None:
+            return self._session.send(signed, timeout=self.transport.timeout, proxies=proxies)
+        start = time.perf_counter()
+        response = self._session.send(signed, timeout=self.transport.timeout, proxies=proxies)
+        self.metrics.observe_sleep(waited)
+        self.metrics.observe_request(endpoint, response.status_code, time.perf_counter() - start, len(response.content or b''))
+        return response
 
     # Checks Response for errors, raises appropiate error or returns operation results
     def _response(self, response: Response) -> Dict:
         try:
             response.raise_for_status()
         except HTTPError:
+            if response.status_code == 429:
+                self.rate_limiter.backoff()
+                raise RateLimitError(f'Rate limited with {response.status_code}')
             # Check if error message is present, client problem probably
-            try:
-                data = response.json()
-                if data['error'] == 'Not logged in':
-                    raise AuthError(f'Auth error with {self.auth}')
-                else:
-                    raise ApiError(data['error'])
-            # Server did not return any response, server might be busy
-            except ValueError:
-                raise HTTPError
-
-        return response.json()['result']
+            data = self._json(response)
+            if data['error'] == 'Not logged in':
+                raise AuthError(f'Auth error with {self.auth}')
+            elif 'rate limit' in str(data['error']).lower():
+                self.rate_limiter.backoff()
+                raise RateLimitError(data['error'])
+            # Server errors are transient whatever the body says, the transport retries them
+            elif response.status_code >= 500:
+                raise HTTPError(f'{response.status_code} server error: {data["error"]}', response=response)
+            else:
+                raise ApiError(data['error'])
+
+        self.rate_limiter.success()
+        return self._json(response)['result']
+
+    # Parses the body once, with orjson when it is installed
+    @staticmethod
+    def _json(response: Response) -> Dict:
+        try:
+            return json_loads(response.content)
+        # Server did not return any response, server might be busy, or the body is truncated or generated by a proxy
+        except (ValueError, TypeError):
+            raise HTTPError(f'{response.status_code} response without a JSON body', response=response)
 
     # Wrapper for client methods that use GET
+    # Cached endpoints are only requested when the cache has no fresh response
     def _get(self, endpoint: str, params: Dict[str, Any] = None) -> Any:
-        return self._response(self._request('GET', endpoint, params=params))
+        if self.cache is None or not self.cache.cacheable(endpoint):
+            return self._get_uncached(endpoint, params)
+        key = ResponseCache.key(self._auth._key, self._auth.subaccount, endpoint, params)
+        hit, result = self.cache.get(key, endpoint)
+        if self.metrics is not None:
+            self.metrics.observe_cache(endpoint, hit)
+        if not hit:
+            result = self._get_uncached(endpoint, params)
+            self.cache.put(key, endpoint, result)
+        return result
+
+    # Drops cached responses of an endpoint, all of them if none is given
+    def invalidate_cache(self, endpoint: str = None) -> None:
+        if self.cache is not None:
+            self.cache.invalidate(endpoint)
+
+    # Rate limited requests are sent again once the limiter has backed off
+    # Requests failing with errors the transport considers transient are sent again after a jittered backoff
+    def _get_uncached(self, endpoint: str, params: Dict[str, Any] = None) -> Any:
+        retries = FtxClient._RATELIMIT_RETRIES
+        attempt = 0
+        while True:
+            try:
+                return self.transport.hedged(lambda: self._response(self._request('GET', endpoint, params=params)))
+            except RateLimitError:
+                retries -= 1
+                if not retries:
+                    raise
+            except (HTTPError, ConnectionError, Timeout) as e:
+                if attempt >= self.transport.retries or not Transport.retryable(e):
+                    raise
+                time.sleep(self.transport.delay(attempt))
+                attempt += 1
+            if self.metrics is not None:
+                self.metrics.observe_retry(endpoint)
 
     # Wrapper for pulling more data that can be passed through a single request
     @staticmethod
     def _paginate(method, *args, **kwargs):
+        return FtxClient._collect(FtxClient._iter_pages(method, *args, **kwargs), [])
+
+    # Records of every page added to results, an interruption resumes collecting into the same list
+    @staticmethod
+    def _collect(pages: Iterator[List[Dict]], results: List[Dict]) -> List[Dict]:
+        try:
+            for page in pages:
+                results.extend(page)
+        except PaginationInterrupted as e:
+            resume = e.resume
+            raise PaginationInterrupted(str(e), lambda: FtxClient._collect(resume(), results), results) from e.__cause__
+        return results
+
+    # Yields each page of new records as soon as it is downloaded, newest first
+    @staticmethod
+    def _iter_pages(method, *args, **kwargs):
         # /funding_payments API call does not use 'limit' despite requiring pagination
         # will error if parameter is sent and defaults to 100 entries being sent at max in a single response
         # /fills API call uses 'limit' but defaults to 20 if parameter is not sent
-        limit = kwargs.get('limit') or 100
-        ids = set()
-        results = []
-        while True:
-            response = method(*args, **kwargs)
-            duplicates_removed = [r for r in response if r['id'] not in ids]
-            results.extend(duplicates_removed)
-            ids |= {d['id'] for d in duplicates_removed}
+        return FtxClient._pages(method, args, kwargs, PageCursor(kwargs.get('limit') or 100))
 
-            # Fills with identical timestamps might get skipped when setting 'end_time'
-            # Must include the largest timestamp again, in case not all fills were included in the response
-            kwargs['end_time'] = min(datetime.fromisoformat(t['time']) for t in response).timestamp() + 1.0
-
-            if len(response) < limit:
-                break
-
-            time.sleep(FtxClient._RATELIMIT)
-        return results
+    # The cursor and kwargs only move forward once a page is received
+    # When a request fails for good, resume() of the raised PaginationInterrupted yields the remaining pages
+    @staticmethod
+    def _pages(method, args: Tuple, kwargs: Dict[str, Any], cursor: PageCursor) -> Iterator[List[Dict]]:
+        while not cursor.done:
+            try:
+                response = method(*args, **kwargs)
+            except (HTTPError, ConnectionError, Timeout, RateLimitError) as e:
+                raise PaginationInterrupted(f'Pagination interrupted after {cursor.pages} pages: {e}', lambda: FtxClient._pages(method, args, kwargs, cursor)) from e
+            page = cursor.advance(response, kwargs)
+            if page:
+                yield page
+        FtxClient._record_pages(method, cursor)
+
+    # Reports a finished pagination to the metrics of the client owning method, if any
+    @staticmethod
+    def _record_pages(method, cursor: PageCursor) -> None:
+        metrics = getattr(getattr(method, '__self__', None), 'metrics', None)
+        if isinstance(metrics, Metrics):
+            endpoint = FtxClient._PAGINATED_ENDPOINTS.get(method.__name__, method.__name__)
+            metrics.observe_pages(endpoint, cursor.pages, cursor.duplicates, cursor.widened)
+
+    # Splits [start_time, end_time] into equal windows and paginates each one on its own thread
+    # Neighbouring windows share their boundary timestamp, fills sitting on it are fetched twice and deduplicated by id
+    @staticmethod
+    def _paginate_sharded(method, shards: int, start_time: float = None, end_time: float = None, **kwargs):
+        if not start_time:
+            raise ValueError('Sharded pagination requires a start_time')
+        end_time = end_time or time.time()
+        # Bounds are exact timestamps like the ones get_fills sends, the outer ones are the requested range itself
+        bounds = [start_time] + [start_time + (end_time - start_time) * i / shards for i in range(1, shards)] + [end_time]
+        # Latest window first so the merged results keep the newest first order of the API
+        windows = list(zip(bounds[-2::-1], bounds[:0:-1]))
+
+        calls = [partial(FtxClient._paginate, method, start_time=start, end_time=end, **kwargs) for start, end in windows]
+        return FtxClient._collect_windows(calls, [None] * len(calls))
+
+    # Paginates every window without results yet on its own thread and merges all windows by id, newest window first
+    # When windows are interrupted for good, resume() of the raised PaginationInterrupted finishes only those and merges again
+    @staticmethod
+    def _collect_windows(calls: List, done: List[List[Dict]]) -> List[Dict]:
+        pending = [i for i, window in enumerate(done) if window is None]
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            futures = {i: executor.submit(calls[i]) for i in pending}
+        interrupted, partial_results = None, []
+        for i, future in futures.items():
+            try:
+                done[i] = future.result()
+            except PaginationInterrupted as e:
+                interrupted = interrupted or e
+                calls[i] = e.resume
+                partial_results.append(e.results or [])
+        results = {}
+        for window in [w for w in done if w is not None] + partial_results:
+            for r in window:
+                results.setdefault(r['id'], r)
+        if interrupted is not None:
+            raise PaginationInterrupted(str(interrupted), lambda: FtxClient._collect_windows(calls, done), list(results.values())) from interrupted.__cause__
+        return list(results.values())
 
     def list_futures(self) -> List[Dict]:
         return self._get('futures')
@@ -143,9 +392,9 @@ class FtxClient(object):
         if limit:
             params['limit'] = limit
         if start_time:
-            params['start_time'] = int(start_time)
+            params['start_time'] = start_time
         if end_time:
-            params['end_time'] = int(end_time)
+            params['end_time'] = end_time
         return self._get('fills', params)
 
     def get_funding_payments(self, future: str = None, start_time: float = None, end_time: float = None) -> List[Dict]:
@@ -153,13 +402,25 @@ class FtxClient(object):
         if future:
             params['future'] = future
         if start_time:
-            params['start_time'] = int(start_time)
+            params['start_time'] = start_time
         if end_time:
-            params['end_time'] = int(end_time)
+            params['end_time'] = end_time
         return self._get('funding_payments', params)
 
-    def get_all_fills(self, market: str = None, start_time: float = None, end_time: float = None) -> List[Dict]:
+    # shards > 1 downloads that many time windows in parallel, a start_time is required
+    def get_all_fills(self, market: str = None, start_time: float = None, end_time: float = None, shards: int = 1) -> List[Dict]:
+        if shards > 1:
+            return FtxClient._paginate_sharded(self.get_fills, shards, market=market, start_time=start_time, end_time=end_time, limit=100)
         return FtxClient._paginate(self.get_fills, market=market, start_time=start_time, end_time=end_time, limit=100)
 
-    def get_all_funding_payments(self, future: str = None, start_time: float = None, end_time: float = None) -> List[Dict]:
+    def get_all_funding_payments(self, future: str = None, start_time: float = None, end_time: float = None, shards: int = 1) -> List[Dict]:
+        if shards > 1:
+            return FtxClient._paginate_sharded(self.get_funding_payments, shards, future=future, start_time=start_time, end_time=end_time)
         return FtxClient._paginate(self.get_funding_payments, future=future, start_time=start_time, end_time=end_time)
+
+    # Streams fills page by page instead of collecting the whole history in memory
+    def iter_fills(self, market: str = None, start_time: float = None, end_time: float = None) -> Iterator[List[Dict]]:
+        return FtxClient._iter_pages(self.get_fills, market=market, start_time=start_time, end_time=end_time, limit=100)
+
+    def iter_funding_payments(self, future: str = None, start_time: float = None, end_time: float = None) -> Iterator[List[Dict]]:
+        return FtxClient._iter_pages(self.get_funding_payments, future=future, start_time=start_time, end_time=end_time)
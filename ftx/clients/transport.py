@@ -0,0 +1,78 @@
+import random
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Tuple, TypeVar
+from requests import ConnectionError, HTTPError, Timeout
+
+# orjson decodes pages several times faster, the standard library is used when it is not installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+T = TypeVar('T')
+
+
+# Timeouts, retries and hedging of the requests sent by a client
+# GET requests are idempotent, those failing with a connection error, a timeout, a 5xx or a body that is not JSON are sent again
+# Backoff is exponential with full jitter so clients failing together do not retry together
+# With hedge_after a duplicate request is sent once the first one is slower than that many seconds, the first response wins
+# pool_size keep-alive connections are kept per host, enough for the threads of sharded pagination and the async client
+class Transport(object):
+
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 30.0, retries: int = 3, backoff: float = 0.25, max_backoff: float = 8.0,
+                 hedge_after: float = None, pool_size: int = 16) -> None:
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.pool_size = pool_size
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        return self.connect_timeout, self.read_timeout
+
+    # Seconds to wait before retry number attempt, counted from 0
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    # Whether a failed request may succeed when sent again
+    @staticmethod
+    def retryable(error: Exception) -> bool:
+        if isinstance(error, (ConnectionError, Timeout)):
+            return True
+        if isinstance(error, HTTPError):
+            # Bodies that are not JSON and server errors, client errors are final
+            return error.response is None or not 400 <= error.response.status_code < 500
+        return False
+
+    # Runs send, and a second send if the first has not finished after hedge_after seconds
+    # Each call of send must build and sign its own request
+    def hedged(self, send: Callable[[], T]) -> T:
+        if self.hedge_after is None:
+            return send()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=8)
+        first = self._executor.submit(send)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+        pending = {first, self._executor.submit(send)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
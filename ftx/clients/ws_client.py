@@ -0,0 +1,136 @@
+import json
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict
+import websockets
+from ftx.clients.rest_client import FtxClient, ApiError, PaginationInterrupted
+
+
+# Streams fills and orders of the client's account over the websocket API
+# Fills are emitted in the same format as /fills so they can be passed to preprocess_fills
+# After a reconnect the gap is backfilled over REST with get_all_fills(start_time=last_seen), from the first connection if no fill was seen yet
+class FtxWebsocketClient(object):
+    _ENDPOINT = 'wss://ftx.com/ws/'
+    _PING_INTERVAL = 15
+    _RECONNECT_DELAY = 1.0
+
+    def __init__(self, client: FtxClient, endpoint: str = _ENDPOINT, since: float = None) -> None:
+        self._client = client
+        self._endpoint = endpoint
+        # Timestamp of the newest fill emitted, fills from this second on are backfilled after a reconnect
+        self._last_seen = since
+        # Time of the first connection, the backfill starts there until a fill is emitted
+        self._connected = None
+        # Fills emitted around the last seen second, the backfill repeats that second
+        self._seen: Dict[Any, float] = {}
+        self._running = False
+        self._ws = None
+
+    @property
+    def last_seen(self) -> float:
+        return self._last_seen
+
+    def stop(self) -> None:
+        self._running = False
+        if self._ws is not None:
+            asyncio.ensure_future(self._ws.close())
+
+    # Keeps the connection alive until stop() is called, reconnecting whenever it drops
+    async def run(self, on_fill: Callable[[Dict], Any], on_order: Callable[[Dict], Any] = None) -> None:
+        self._running = True
+        while self._running:
+            connected = time.time()
+            try:
+                async with websockets.connect(self._endpoint) as ws:
+                    self._ws = ws
+                    await self._subscribe(ws)
+                    # Subscribed first so nothing is lost between the backfill and the stream
+                    if self._last_seen is not None or self._connected is not None:
+                        await self._backfill(on_fill)
+                    if self._connected is None:
+                        self._connected = connected
+                    pinger = asyncio.ensure_future(self._ping(ws))
+                    try:
+                        async for message in ws:
+                            self._dispatch(json.loads(message), on_fill, on_order)
+                    finally:
+                        pinger.cancel()
+            # Dropped connections, rejected handshakes and backfills that failed after every retry are all retried after a delay,
+            # the next backfill starts from the same timestamp
+            except (websockets.WebSocketException, PaginationInterrupted, OSError):
+                pass
+            finally:
+                self._ws = None
+            if self._running:
+                await asyncio.sleep(FtxWebsocketClient._RECONNECT_DELAY)
+
+    # Async iterator over new fills, the connection is handled in the background
+    async def fills(self) -> AsyncIterator[Dict]:
+        queue = asyncio.Queue()
+        task = asyncio.ensure_future(self.run(queue.put_nowait))
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    # Connection loop ended, raise its error if any
+                    task.result()
+                    return
+                yield getter.result()
+        finally:
+            self.stop()
+            task.cancel()
+
+    async def _subscribe(self, ws) -> None:
+        if self._client.auth._key:
+            await ws.send(self._client.auth.sign_ws_message())
+        for channel in ('fills', 'orders'):
+            await ws.send(json.dumps({'op': 'subscribe', 'channel': channel}))
+
+    async def _ping(self, ws) -> None:
+        while True:
+            await asyncio.sleep(FtxWebsocketClient._PING_INTERVAL)
+            await ws.send(json.dumps({'op': 'ping'}))
+
+    # A drop before the first fill is backfilled from the first connection on
+    @property
+    def _backfill_start(self) -> float:
+        return self._connected if self._last_seen is None else self._last_seen
+
+    async def _backfill(self, on_fill: Callable[[Dict], Any]) -> None:
+        loop = asyncio.get_running_loop()
+        fills = await loop.run_in_executor(None, lambda: self._client.get_all_fills(start_time=self._backfill_start))
+        # REST returns newest first
+        for fill in reversed(fills):
+            self._emit(fill, on_fill)
+
+    def _dispatch(self, message: Dict, on_fill: Callable[[Dict], Any], on_order: Callable[[Dict], Any]) -> None:
+        if message.get('type') == 'error':
+            self._running = False
+            raise ApiError(message.get('msg'))
+        if message.get('type') != 'update':
+            return
+        if message['channel'] == 'fills':
+            self._emit(FtxWebsocketClient._rest_fill(message['data']), on_fill)
+        elif message['channel'] == 'orders' and on_order is not None:
+            on_order(message['data'])
+
+    # Drops fills already emitted and keeps track of the newest timestamp
+    def _emit(self, fill: Dict, on_fill: Callable[[Dict], Any]) -> None:
+        if fill['id'] in self._seen:
+            return
+        timestamp = datetime.fromisoformat(fill['time']).timestamp()
+        self._last_seen = max(timestamp, self._last_seen or timestamp)
+        self._seen[fill['id']] = timestamp
+        self._seen = {i: t for i, t in self._seen.items() if t >= int(self._last_seen) - 1}
+        on_fill(fill)
+
+    # Websocket fills lack the currency fields of /fills, spot markets are named BASE/QUOTE
+    @staticmethod
+    def _rest_fill(fill: Dict) -> Dict:
+        base, quote = fill['market'].split('/') if fill.get('future') is None and '/' in fill['market'] else (None, None)
+        fill.setdefault('baseCurrency', base)
+        fill.setdefault('quoteCurrency', quote)
+        return fill
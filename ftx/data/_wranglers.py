@@ -1,8 +1,11 @@
 from decimal import Decimal, getcontext
-from typing import Dict, Tuple
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
 import numpy as np
 import pandas as pd
 import ftx.data._precisions as prec
+from ftx.data.markets import MarketRegistry, static_registry
+from ftx.metrics import stage
 
 getcontext().prec = 6
 
@@ -11,75 +14,195 @@ def decimal_with_precision(x: str, precision: int) -> Decimal:
     return round(Decimal(x), precision)
 
 
-def convert_futures_size(futures_fills: pd.DataFrame) -> pd.DataFrame:
-    futures_fills.loc[:, 'size'] = futures_fills.loc[:, ['size']].astype('str')
-    for mkt in futures_fills['market'].unique():
-        mkt = mkt.split('-')[0]
+# Decimal conversion done once per precision group instead of once per market
+def _to_decimal(values: pd.Series, precision: pd.Series) -> pd.Series:
+    strings = values.astype('str').to_numpy()
+    precision = precision.to_numpy()
+    converted = np.empty(len(strings), dtype='object')
+    for p in np.unique(precision):
+        rows = np.flatnonzero(precision == p)
+        converted[rows] = [decimal_with_precision(x, int(p)) for x in strings[rows]]
+    return pd.Series(converted, index=values.index)
 
-        # Will error if there is no entry in the Precisions Dict.
-        futures_fills.loc[futures_fills['market'].str.contains(mkt), 'size'] = futures_fills.loc[futures_fills['market'].str.contains(mkt), 'size'].apply(decimal_with_precision, args=(prec.FUTURES_SIZE[mkt], ))
+
+# Precisions come from the registry, the static table when none is given
+def _registry(registry: MarketRegistry) -> MarketRegistry:
+    return static_registry() if registry is None else registry
+
+
+@stage('convert_futures_size')
+def convert_futures_size(futures_fills: pd.DataFrame, registry: MarketRegistry = None) -> pd.DataFrame:
+    futures_fills['size'] = _to_decimal(futures_fills['size'], _registry(registry).size_precision(futures_fills['market']))
     return futures_fills
 
 
-def convert_futures_price(futures_fills: pd.DataFrame) -> pd.DataFrame:
-    futures_fills.loc[:, 'price'] = futures_fills.loc[:, ['price']].astype('str')
-    for mkt in futures_fills['market'].unique():
-        mkt = mkt.split('-')[0]
-        futures_fills.loc[futures_fills['market'].str.contains(mkt), 'price'] = futures_fills.loc[futures_fills['market'].str.contains(mkt), 'price'].apply(decimal_with_precision, args=(prec.FUTURES_PRICE[mkt], ))
+def convert_futures_price(futures_fills: pd.DataFrame, registry: MarketRegistry = None) -> pd.DataFrame:
+    futures_fills['price'] = _to_decimal(futures_fills['price'], _registry(registry).price_precision(futures_fills['market']))
     return futures_fills
 
 
 def convert_futures_fee(futures_fills: pd.DataFrame) -> pd.DataFrame:
-    futures_fills.loc[:, 'fee'] = futures_fills.loc[:, ['fee']].astype('str')
-    for mkt in futures_fills['market'].unique():
-        mkt = mkt.split('-')[0]
-        futures_fills.loc[futures_fills['market'].str.contains(mkt), 'fee'] = futures_fills.loc[futures_fills['market'].str.contains(mkt), 'fee'].apply(decimal_with_precision, args=(prec.FUTURES_FEE, ))
+    futures_fills['fee'] = _to_decimal(futures_fills['fee'], pd.Series(prec.FUTURES_FEE, index=futures_fills.index))
     return futures_fills
 
 
 def convert_futures_feeRate(futures_fills: pd.DataFrame) -> pd.DataFrame:
-    futures_fills.loc[:, 'feeRate'] = futures_fills.loc[:, ['feeRate']].astype('str')
-    futures_fills.loc[:, 'feeRate'] = futures_fills.loc[:, 'feeRate'].apply(decimal_with_precision, args=(prec.FUTURES_FEERATE, ))
+    futures_fills['feeRate'] = _to_decimal(futures_fills['feeRate'], pd.Series(prec.FUTURES_FEERATE, index=futures_fills.index))
+    return futures_fills
+
+
+# Fixed point columns hold int64 multiples of 10 ** -precision, the multiplier is kept in a '<column>_scale' column
+# Deltas, sums and comparisons to zero are exact and run at NumPy speed
+def fixed_point(values: pd.Series, scale: pd.Series) -> pd.Series:
+    return np.round(values.astype('float') * scale).astype('int64')
+
+
+def from_fixed_point(fills: pd.DataFrame, column: str) -> pd.Series:
+    return fills[column] / fills[f'{column}_scale']
+
+
+@stage('convert_futures_size_fixed')
+def convert_futures_size_fixed(futures_fills: pd.DataFrame, registry: MarketRegistry = None) -> pd.DataFrame:
+    futures_fills['size_scale'] = 10**_registry(registry).size_precision(futures_fills['market'])
+    futures_fills['size'] = fixed_point(futures_fills['size'], futures_fills['size_scale'])
+    return futures_fills
+
+
+def convert_futures_price_fixed(futures_fills: pd.DataFrame, registry: MarketRegistry = None) -> pd.DataFrame:
+    futures_fills['price_scale'] = 10**_registry(registry).price_precision(futures_fills['market'])
+    futures_fills['price'] = fixed_point(futures_fills['price'], futures_fills['price_scale'])
+    return futures_fills
+
+
+def convert_futures_fee_fixed(futures_fills: pd.DataFrame) -> pd.DataFrame:
+    futures_fills['fee_scale'] = np.int64(10**prec.FUTURES_FEE)
+    futures_fills['fee'] = fixed_point(futures_fills['fee'], futures_fills['fee_scale'])
     return futures_fills
 
 
+# Size as float whether it is stored as Decimal or fixed point
+def _size_as_float(fills: pd.DataFrame) -> pd.Series:
+    if 'size_scale' in fills:
+        return from_fixed_point(fills, 'size')
+    return fills['size'].astype('float')
+
+
 def compute_deltas(fills: pd.DataFrame) -> pd.DataFrame:
     fills['size'] = fills['size'].mask(fills['side'] == 'sell', -fills['size'])
     fills['delta'] = fills['size'].cumsum()
     return fills
 
 
-def preprocess_fills(fills: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
-
-    # Convert unique identifiers to string
-    fills['id'] = fills['id'].astype('str')
-    fills['orderId'] = fills['orderId'].astype('str')
-    fills['tradeId'] = fills['tradeId'].astype('str')
-
-    fills['time'] = pd.to_datetime(fills['time'])
+# Column dtypes of fills once ingested, in the order returned by /fills, other columns are dropped
+# Low cardinality strings are categoricals and ids are integers, orderId and tradeId can be null
+# Prices, sizes, fees and rates stay float64, float32 would already change the computed volumes and fees
+FILLS_SCHEMA = {
+    'fee': 'float64',
+    'feeCurrency': 'category',
+    'feeRate': 'float64',
+    'future': 'category',
+    'id': 'int64',
+    'liquidity': 'category',
+    'market': 'category',
+    'baseCurrency': 'category',
+    'quoteCurrency': 'category',
+    'orderId': 'Int64',
+    'tradeId': 'Int64',
+    'price': 'float64',
+    'size': 'float64',
+    'side': 'category',
+    'time': 'datetime64[ns, UTC]',
+    'type': 'category',
+}
+
+
+# Returns a new frame in the FILLS_SCHEMA layout, missing columns are added as nulls
+def typed_fills(fills: pd.DataFrame) -> pd.DataFrame:
+    fills = fills.reindex(columns=list(FILLS_SCHEMA))
+    # Parsed as UTC so empty and non-empty frames both end up with the declared resolution and timezone
+    fills['time'] = pd.to_datetime(fills['time'], utc=True)
+    return fills.astype(FILLS_SCHEMA)
+
+
+# Per market frames as a read-only mapping, markets in order of first appearance
+# Rows are sorted by market once and each market is a slice of that frame found through an offsets index
+# Slices share memory with the sorted frame, on pandas without copy-on-write copy one before modifying it in place
+class MarketFrames(Mapping):
+
+    def __init__(self, frame: pd.DataFrame, column: str = 'market') -> None:
+        codes, keys = pd.factorize(frame[column])
+        # Rows without a market have code -1, they sort first and are not part of any slice
+        self._frame = frame.take(np.argsort(codes, kind='stable'))
+        offsets = np.cumsum(np.concatenate([[(codes < 0).sum()], np.bincount(codes[codes >= 0], minlength=len(keys))]))
+        self._offsets = {key: (offsets[i], offsets[i + 1]) for i, key in enumerate(keys)}
+
+    def __getitem__(self, market: str) -> pd.DataFrame:
+        start, stop = self._offsets[market]
+        return self._frame.iloc[start:stop]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __repr__(self) -> str:
+        return f'MarketFrames({list(self._offsets)})'
+
+
+# Read-only mapping computing each value on first access, later accesses return the cached value
+class LazyMapping(Mapping):
+
+    def __init__(self, keys: Iterable[str], function: Callable[[str], Any]) -> None:
+        # Ordered set of keys
+        self._keys = dict.fromkeys(keys)
+        self._function = function
+        self._cache: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._cache:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._cache[key] = self._function(key)
+        return self._cache[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f'LazyMapping({list(self._keys)})'
+
+
+# fixed_point=True stores futures sizes as scaled int64 instead of Decimal objects
+# Size precisions come from the registry, the static table when none is given
+# The input frame is left untouched
+@stage('preprocess_fills')
+def preprocess_fills(fills: pd.DataFrame, fixed_point: bool = False,
+                     registry: MarketRegistry = None) -> Tuple[pd.DataFrame, pd.DataFrame, MarketFrames, MarketFrames]:
+
+    fills = typed_fills(fills)
     # Sort fills by time and id
-    fills.sort_values(['time', 'id'], inplace=True, axis=0, ignore_index=True)
+    fills = fills.sort_values(['time', 'id'], axis=0, ignore_index=True)
     # Add volume column
     fills['volume'] = fills['size'] * fills['price']
 
-    # Split spot and futures
-    spot = fills[(fills['future'].isnull()) & (fills['type'] != 'otc')].copy()
-    futures = fills[fills['future'].notnull()].copy()
-
+    # Split spot and futures, take() copies the selected rows once
+    is_future = fills['future'].notnull().to_numpy()
+    spot = fills.take(np.flatnonzero(~is_future & (fills['type'] != 'otc').to_numpy()))
     # Drop unused columns in futures
-    futures.drop('baseCurrency', axis=1, inplace=True)
-    futures.drop('quoteCurrency', axis=1, inplace=True)
-
-    # Convert size to Decimal
-    futures = convert_futures_size(futures)
+    futures = fills.take(np.flatnonzero(is_future)).drop(columns=['baseCurrency', 'quoteCurrency'])
 
-    # Split futures by market
-    futures_by_market = {mkt: futures[futures['market'] == mkt].copy() for mkt in futures['market'].unique()}
-    spot_by_market = {mkt: spot[spot['market'] == mkt].copy() for mkt in spot['market'].unique()}
+    # Convert size to Decimal or fixed point
+    futures = convert_futures_size_fixed(futures, registry) if fixed_point else convert_futures_size(futures, registry)
 
-    return spot, futures, futures_by_market, spot_by_market
+    # Split by market
+    return spot, futures, MarketFrames(futures), MarketFrames(spot)
 
 
+@stage('preprocess_funding')
 def preprocess_funding(funding: pd.DataFrame) -> pd.DataFrame:
 
     # Convert time
@@ -90,43 +213,57 @@ def preprocess_funding(funding: pd.DataFrame) -> pd.DataFrame:
 # Mark fills that belong to the same trade
 # A trade starts when market delta is flipped from neutral (0) to long (+) or short (-)
 # A fill that flips delta sign is considered to end one trade and open another, and it is split accordingly
+# Works on the column arrays in a single pass and returns a new frame, the input is left untouched
+@stage('add_trades')
 def add_trades(fills: pd.DataFrame) -> pd.DataFrame:
 
-    fills = compute_deltas(fills)
-
-    # Mark fills that flipped the delta sign
-    flip_counter = np.sign(fills['delta']) * np.sign(fills['delta'].shift().fillna(0))
-    flip_counter[flip_counter > 0] = 0
-    flip_counter = flip_counter.abs().astype('int') + 1
-
-    # Duplicate rows where the fill needs to be split
-    fills = fills.reindex(fills.index.repeat(flip_counter.values))
-    # Same timestamp can appear for multiple fills, find duplicates by ID
-    # Duplicates are in sets of 2, set flags for both occurences
-    fills['split_fill'] = np.nan
-
-    # keep='last' will consider the second fill to be the original and mark the first as the duplicate
-    fills.loc[fills['id'].duplicated(keep='last'), 'split_fill'] = 'first'
-    # keep='first' will consider the first fill to be the original and mark the second as the duplicate
-    fills.loc[fills['id'].duplicated(keep='first'), 'split_fill'] = 'second'
-
-    # preserve uniqueness of identifier columns, ID contains digits only so collisions are avoided
-    fills.loc[fills['split_fill'] == 'second', 'orderId'] += 'b'
-    fills.loc[fills['split_fill'] == 'second', 'tradeId'] += 'b'
-    fills.loc[fills['split_fill'] == 'second', 'id'] += 'b'
-
-    # Recompute split_fills accordingly
-    # First
-    fills.loc[fills['split_fill'] == 'first',
-              'size'] = np.sign(fills.loc[fills['split_fill'] == 'first', 'size']) * (np.abs(fills.loc[fills['split_fill'] == 'first', 'size']) - np.abs(fills.loc[fills['split_fill'] == 'first', 'delta']))
-    fills.loc[fills['split_fill'] == 'first', 'volume'] = np.abs(fills.loc[fills['split_fill'] == 'first', 'size'].astype('float')) * fills.loc[fills['split_fill'] == 'first', 'price']
-    fills.loc[fills['split_fill'] == 'first', 'fee'] = fills.loc[fills['split_fill'] == 'first', 'volume'] * fills.loc[fills['split_fill'] == 'first', 'feeRate']
-    fills.loc[fills['split_fill'] == 'first', 'delta'] = Decimal('0.0000')
-    # Second
-    fills.loc[fills['split_fill'] == 'second', 'size'] = fills.loc[fills['split_fill'] == 'second', 'delta']
-    fills.loc[fills['split_fill'] == 'second', 'volume'] = np.abs(fills.loc[fills['split_fill'] == 'second', 'size'].astype('float')) * fills.loc[fills['split_fill'] == 'second', 'price']
-    fills.loc[fills['split_fill'] == 'second', 'fee'] = fills.loc[fills['split_fill'] == 'second', 'volume'] * fills.loc[fills['split_fill'] == 'second', 'feeRate']
+    size = fills['size'].to_numpy()
+    size = np.where((fills['side'] == 'sell').to_numpy(), -size, size)
+    delta = np.cumsum(size)
+    previous = np.concatenate([delta[:1] * 0, delta[:-1]])
+
+    # Fills that flipped the delta sign are emitted twice, 'first' closes the trade and 'second' opens the next one
+    flipped = ((delta > 0) & (previous < 0)) | ((delta < 0) & (previous > 0))
+    rows = np.repeat(np.arange(len(fills)), flipped + 1)
+    first = np.flatnonzero(flipped) + np.arange(flipped.sum())
+    second = first + 1
+
+    fills = fills.iloc[rows].copy()
+    size = size[rows]
+    delta = delta[rows]
+    volume = fills['volume'].to_numpy(dtype='float', copy=True)
+    fee = fills['fee'].to_numpy(dtype='float', copy=True)
+    price = fills['price'].to_numpy(dtype='float')
+    fee_rate = fills['feeRate'].to_numpy(dtype='float')
+    scale = fills['size_scale'].to_numpy() if 'size_scale' in fills else 1
+
+    # First part keeps what was needed to bring delta back to zero
+    size[first] = np.sign(size[first]) * (np.abs(size[first]) - np.abs(delta[first]))
+    delta[first] = 0 if 'size_scale' in fills else Decimal('0.0000')
+    # Second part carries the new delta
+    size[second] = delta[second]
+    split = np.concatenate([first, second])
+    volume[split] = np.abs((size / scale)[split].astype('float')) * price[split]
+    fee[split] = volume[split] * fee_rate[split]
+
+    split_fill = np.full(len(fills), np.nan, dtype='object')
+    split_fill[first] = 'first'
+    split_fill[second] = 'second'
+
+    fills['size'] = size
+    fills['volume'] = volume
+    fills['fee'] = fee
+    fills['delta'] = delta
+    fills['split_fill'] = split_fill
+
+    # preserve uniqueness of string identifier columns, ID contains digits only so collisions are avoided
+    # Integer ids of FILLS_SCHEMA are repeated, the two parts are told apart by split_fill
+    for column in ('orderId', 'tradeId', 'id'):
+        if not pd.api.types.is_integer_dtype(fills[column]):
+            ids = fills[column].to_numpy(dtype='object', copy=True)
+            ids[second] = ids[second] + 'b'
+            fills[column] = ids
 
     # Mark fills belonging to the same trade
-    fills['trade_nr'] = fills['delta'].shift().eq(0).cumsum()
+    fills['trade_nr'] = np.concatenate([[False], delta[:-1] == 0]).cumsum()
     return fills
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, NamedTuple, Tuple
+import pandas as pd
+from ftx.clients.rest_client import FtxClient
+from ftx.data._wranglers import preprocess_fills, preprocess_funding
+from ftx.data.fetch import _fills_frame, _funding_frame, _positions_frame
+from ftx.data.markets import MarketRegistry
+from ftx.data.process import get_futures_summary, get_spot_summary
+
+
+class AccountHistory(NamedTuple):
+    spot_fills: pd.DataFrame
+    futures_fills: pd.DataFrame
+    futures_by_market: Dict[str, pd.DataFrame]
+    spot_by_market: Dict[str, pd.DataFrame]
+    funding: pd.DataFrame
+    open_positions: pd.DataFrame
+
+
+# Fetches fills, funding payments and open positions of several subaccounts at once, keyed by subaccount
+# Subaccounts are discovered through get_subaccounts if none are given, '' stands for the main account and is always included
+# Every subaccount client shares the rate limiter, response cache, metrics and transport of the given client
+# so the whole run stays within one budget and is retried and recorded like the client's own requests
+# Market metadata is shared by subaccounts, one registry serves all of them
+def subaccounts_history(client: FtxClient, subaccounts: Iterable[str] = None, workers: int = 16,
+                        registry: MarketRegistry = None) -> Dict[str, AccountHistory]:
+    if subaccounts is None:
+        subaccounts = [''] + [s['nickname'] for s in client.get_subaccounts()]
+    clients = {name: FtxClient(client.auth.for_subaccount(name), client.rate_limiter, client.metrics, client.cache, client.transport) for name in subaccounts}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fills = {name: executor.submit(c.get_all_fills) for name, c in clients.items()}
+        funding = {name: executor.submit(c.get_all_funding_payments) for name, c in clients.items()}
+        positions = {name: executor.submit(c.get_positions) for name, c in clients.items()}
+
+        return {
+            name: AccountHistory(
+                *preprocess_fills(_fills_frame(fills[name].result()), registry=registry),
+                preprocess_funding(_funding_frame(funding[name].result())),
+                _positions_frame(positions[name].result()),
+            )
+            for name in clients
+        }
+
+
+# Futures summary of every subaccount and a consolidated summary over all of them
+def subaccounts_futures_summary(histories: Dict[str, AccountHistory]) -> Tuple[Dict[str, pd.DataFrame], pd.DataFrame]:
+    summaries = {name: get_futures_summary(h.futures_fills, h.funding, h.open_positions) for name, h in histories.items()}
+    parts = list(histories.values()) or [_empty_history()]
+    consolidated = get_futures_summary(
+        _concat([h.futures_fills for h in parts]),
+        _concat([h.funding for h in parts]),
+        _concat([h.open_positions for h in parts]),
+    )
+    return summaries, consolidated
+
+
+# Spot summary of every subaccount and a consolidated summary over all of them
+def subaccounts_spot_summary(histories: Dict[str, AccountHistory]) -> Tuple[Dict[str, pd.DataFrame], pd.DataFrame]:
+    summaries = {name: get_spot_summary(h.spot_fills) for name, h in histories.items()}
+    consolidated = get_spot_summary(_concat([h.spot_fills for h in list(histories.values()) or [_empty_history()]]))
+    return summaries, consolidated
+
+
+# History of an account without any fills, funding or positions, consolidates to empty summaries
+def _empty_history() -> AccountHistory:
+    return AccountHistory(*preprocess_fills(_fills_frame([])), preprocess_funding(_funding_frame([])), _positions_frame([]))
+
+
+def _concat(frames) -> pd.DataFrame:
+    return pd.concat([f for f in frames if not f.empty] or frames[:1], ignore_index=True)
@@ -0,0 +1,249 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+from urllib import parse
+import numpy as np
+import pandas as pd
+from ftx.data._wranglers import LazyMapping, MarketFrames
+
+
+# pyarrow is only needed by the archive, it is imported on first use
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+    except ImportError:
+        raise ImportError('HistoryArchive requires pyarrow, install it with pip install pyarrow')
+    return pyarrow
+
+
+# Month key of a timestamp, ie 202001 for January 2020
+def _month(timestamp: float) -> int:
+    date = datetime.fromtimestamp(timestamp, timezone.utc)
+    return date.year * 100 + date.month
+
+
+# Same categorical columns with the union of their categories, sorted, so frames concatenate without falling back to object
+def _union_categories(frames: List[pd.DataFrame]) -> List[pd.DataFrame]:
+    columns = [c for c in frames[0].columns if isinstance(frames[0][c].dtype, pd.CategoricalDtype)]
+    if len(frames) < 2 or not columns:
+        return frames
+    dtypes = {}
+    for column in columns:
+        categories = set()
+        for df in frames:
+            categories.update(df[column].cat.categories if isinstance(df[column].dtype, pd.CategoricalDtype) else df[column].dropna().unique())
+        dtypes[column] = pd.CategoricalDtype(sorted(categories))
+    return [df.astype(dtypes) for df in frames]
+
+
+# Processed histories saved as uncompressed Arrow IPC (Feather v2) files, one per market and month
+# Layout is <path>/<kind>/<market>/<YYYYMM>.arrow, market names are url quoted since spot markets contain '/'
+# Files are memory mapped on load and only the partitions of the requested markets and months are opened
+# Histories can also be built chunk by chunk with append_fills and append_funding, only the partitions a chunk touches are rewritten
+class HistoryArchive(object):
+    _TIME_COLUMNS = {'spot': 'time', 'futures': 'time', 'funding': 'time', 'trades': 'start'}
+    _MARKET_COLUMNS = {'spot': 'market', 'futures': 'market', 'funding': 'future'}
+    # Zero rows file holding the columns and dtypes of a kind, used when nothing matches
+    _EMPTY = '_empty.arrow'
+    # Index the next appended fills and funding payments start from
+    _NEXT = '_next.json'
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def save_fills(self, fills: Tuple[pd.DataFrame, pd.DataFrame, Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]) -> None:
+        spot, futures, _, _ = fills
+        self._save('spot', spot)
+        self._save('futures', futures)
+        self._set_next('fills', self._end(spot, futures))
+
+    # Adds the fills of one chunk, as returned by preprocess_fills, to the saved ones
+    # Chunks must be appended in time order, oldest first, rows keep their order by continuing the index of the previous chunk
+    # Fills already archived are skipped by id, so chunks may overlap on their boundary
+    def append_fills(self, fills: Tuple[pd.DataFrame, pd.DataFrame, Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]) -> None:
+        spot, futures, _, _ = fills
+        start = self._next('fills')
+        self._append('spot', spot, start)
+        self._append('futures', futures, start)
+        self._set_next('fills', start + self._end(spot, futures))
+
+    # Same tuple as fills_history, rows in their original order
+    # start_time and end_time are timestamps in seconds, both inclusive
+    def load_fills(self, markets: List[str] = None, start_time: float = None,
+                   end_time: float = None) -> Tuple[pd.DataFrame, pd.DataFrame, MarketFrames, MarketFrames]:
+        spot = self._load('spot', markets, start_time, end_time)
+        futures = self._load('futures', markets, start_time, end_time)
+        return spot, futures, MarketFrames(futures), MarketFrames(spot)
+
+    def save_funding(self, funding: pd.DataFrame) -> None:
+        self._save('funding', funding)
+        self._set_next('funding', self._end(funding))
+
+    # Adds funding payments of one chunk, as returned by preprocess_funding, same rules as append_fills
+    def append_funding(self, funding: pd.DataFrame) -> None:
+        start = self._next('funding')
+        self._append('funding', funding, start)
+        self._set_next('funding', start + self._end(funding))
+
+    def load_funding(self, futures: List[str] = None, start_time: float = None, end_time: float = None) -> pd.DataFrame:
+        return self._load('funding', futures, start_time, end_time)
+
+    def save_trades(self, trades_by_market: Dict[str, pd.DataFrame]) -> None:
+        self._clear('trades')
+        for market, trades in trades_by_market.items():
+            if not os.path.exists(os.path.join(self._dir('trades'), HistoryArchive._EMPTY)):
+                self._write(os.path.join(self._dir('trades'), HistoryArchive._EMPTY), trades.iloc[:0])
+            self._write_partitions('trades', market, trades)
+
+    # Trades of a market are read when it is first accessed, trades are selected by their start time
+    def load_trades(self, markets: List[str] = None, start_time: float = None, end_time: float = None) -> LazyMapping:
+        saved = self._markets('trades')
+        markets = saved if markets is None else [m for m in markets if m in saved]
+        return LazyMapping(markets, lambda market: self._load('trades', [market], start_time, end_time))
+
+    # Memory mapped Arrow tables of the matching partitions, no data is copied
+    def tables(self, kind: str, markets: List[str] = None, start_time: float = None, end_time: float = None) -> List:
+        first = _month(start_time) if start_time is not None else 0
+        last = _month(end_time) if end_time is not None else 999999
+        return self._read(self._partitions(kind, markets, first, last))
+
+    # Month keys holding fills or funding, ie 202001 for January 2020
+    def months(self) -> List[int]:
+        months = set()
+        for kind in ('spot', 'futures', 'funding'):
+            for market in self._markets(kind):
+                months.update(int(name.split('.')[0]) for name in os.listdir(self._dir(kind, market)))
+        return sorted(months)
+
+    # Yields the fills and funding of one month at a time, oldest first, in the formats of fills_history and funding_history
+    def iter_months(self) -> Iterator[Tuple[Tuple[pd.DataFrame, pd.DataFrame, MarketFrames, MarketFrames], pd.DataFrame]]:
+        for month in self.months():
+            spot = self._frame('spot', self._read(self._partitions('spot', None, month, month)))
+            futures = self._frame('futures', self._read(self._partitions('futures', None, month, month)))
+            funding = self._frame('funding', self._read(self._partitions('funding', None, month, month)))
+            yield (spot, futures, MarketFrames(futures), MarketFrames(spot)), funding
+
+    def _dir(self, kind: str, market: str = None) -> str:
+        if market is None:
+            return os.path.join(self._path, kind)
+        return os.path.join(self._path, kind, parse.quote(market, safe=''))
+
+    def _clear(self, kind: str) -> None:
+        shutil.rmtree(self._dir(kind), ignore_errors=True)
+        os.makedirs(self._dir(kind))
+
+    def _save(self, kind: str, df: pd.DataFrame) -> None:
+        self._clear(kind)
+        self._write(os.path.join(self._dir(kind), HistoryArchive._EMPTY), df.iloc[:0])
+        for market, frame in MarketFrames(df, HistoryArchive._MARKET_COLUMNS[kind]).items():
+            self._write_partitions(kind, market, frame)
+
+    # Index past the last row of the frames, 0 when they are empty
+    @staticmethod
+    def _end(*frames: pd.DataFrame) -> int:
+        return max([int(df.index.max()) + 1 for df in frames if not df.empty] or [0])
+
+    def _next(self, group: str) -> int:
+        path = os.path.join(self._path, HistoryArchive._NEXT)
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return json.load(f).get(group, 0)
+
+    def _set_next(self, group: str, value: int) -> None:
+        path = os.path.join(self._path, HistoryArchive._NEXT)
+        state = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+        state[group] = value
+        with open(path, 'w') as f:
+            json.dump(state, f)
+
+    def _append(self, kind: str, df: pd.DataFrame, start: int) -> None:
+        os.makedirs(self._dir(kind), exist_ok=True)
+        if not os.path.exists(os.path.join(self._dir(kind), HistoryArchive._EMPTY)):
+            self._write(os.path.join(self._dir(kind), HistoryArchive._EMPTY), df.iloc[:0])
+        if df.empty:
+            return
+        df = df.set_axis(df.index + start)
+        for market, frame in MarketFrames(df, HistoryArchive._MARKET_COLUMNS[kind]).items():
+            self._write_partitions(kind, market, frame, merge=True)
+
+    # The market is converted to Arrow once and each month is written from a slice of it
+    # With merge, months already saved are read back and the new rows are added to them
+    def _write_partitions(self, kind: str, market: str, df: pd.DataFrame, merge: bool = False) -> None:
+        os.makedirs(self._dir(kind, market), exist_ok=True)
+        time = df[HistoryArchive._TIME_COLUMNS[kind]]
+        months = (time.dt.year * 100 + time.dt.month).to_numpy()
+        if (np.diff(months) < 0).any():
+            order = np.argsort(months, kind='stable')
+            df, months = df.iloc[order], months[order]
+        table = _pyarrow().Table.from_pandas(df, preserve_index=True)
+        keys, starts, counts = np.unique(months, return_index=True, return_counts=True)
+        for month, start, count in zip(keys, starts, counts):
+            path = os.path.join(self._dir(kind, market), f'{month}.arrow')
+            if merge and os.path.exists(path):
+                saved = _pyarrow().feather.read_table(path).to_pandas()
+                merged = pd.concat(_union_categories([saved, df.iloc[start:start + count]]))
+                self._write(path, merged[~merged['id'].duplicated()].sort_index(kind='stable'))
+            else:
+                self._write(path, table.slice(start, count))
+
+    def _write(self, path: str, df) -> None:
+        pa = _pyarrow()
+        table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=True)
+        # Uncompressed so the file can be memory mapped
+        pa.feather.write_feather(table, path, compression='uncompressed')
+
+    def _markets(self, kind: str) -> List[str]:
+        if not os.path.isdir(self._dir(kind)):
+            return []
+        return sorted(parse.unquote(name) for name in os.listdir(self._dir(kind)) if name != HistoryArchive._EMPTY)
+
+    # Files of the markets and months between first and last, both inclusive
+    def _partitions(self, kind: str, markets: List[str], first: int, last: int) -> List[str]:
+        paths = []
+        for market in self._markets(kind) if markets is None else markets:
+            directory = self._dir(kind, market)
+            if not os.path.isdir(directory):
+                continue
+            months = sorted(int(name.split('.')[0]) for name in os.listdir(directory))
+            paths.extend(os.path.join(directory, f'{month}.arrow') for month in months if first <= month <= last)
+        return paths
+
+    def _read(self, paths: List[str]) -> List:
+        feather = _pyarrow().feather
+        return [feather.read_table(path, memory_map=True) for path in paths]
+
+    def _frame(self, kind: str, tables: List) -> pd.DataFrame:
+        pa = _pyarrow()
+        if not tables:
+            empty = os.path.join(self._dir(kind), HistoryArchive._EMPTY)
+            # Nothing of this kind was saved, the columns selections and MarketFrames rely on are still there
+            if not os.path.exists(empty):
+                return pd.DataFrame({
+                    HistoryArchive._TIME_COLUMNS[kind]: pd.Series(dtype='datetime64[ns, UTC]'),
+                    HistoryArchive._MARKET_COLUMNS.get(kind, 'market'): pd.Series(dtype='object'),
+                })
+            return pa.feather.read_table(empty).to_pandas()
+        # Tables with the same column types, ie Decimal sizes of the same precision, are joined without copying and converted at once
+        by_schema = {}
+        for table in tables:
+            by_schema.setdefault(tuple(table.schema.types), []).append(table)
+        df = pd.concat(_union_categories([pa.concat_tables(group).to_pandas() for group in by_schema.values()]))
+        # Rows keep the index of the saved frame, sorting on it restores the original order
+        return df.sort_index(kind='stable')
+
+    def _load(self, kind: str, markets: List[str], start_time: float, end_time: float) -> pd.DataFrame:
+        df = self._frame(kind, self.tables(kind, markets, start_time, end_time))
+        time = df[HistoryArchive._TIME_COLUMNS[kind]]
+        keep = np.ones(len(df), dtype='bool')
+        if start_time is not None:
+            keep &= (time >= pd.Timestamp(start_time, unit='s', tz='UTC')).to_numpy()
+        if end_time is not None:
+            keep &= (time <= pd.Timestamp(end_time, unit='s', tz='UTC')).to_numpy()
+        return df if keep.all() else df[keep]
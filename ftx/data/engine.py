@@ -0,0 +1,145 @@
+from typing import Any, Dict, List
+import pandas as pd
+from ftx.data._wranglers import MarketFrames, add_trades, preprocess_fills, preprocess_funding
+from ftx.data.archive import HistoryArchive
+from ftx.data.markets import MarketRegistry
+from ftx.data.process import (_exact_terms, _funding_totals, _group_terms, _market_terms, _terms_totals, _futures_summary, _spot_fees,
+                              _spot_summary, _trades_table, _add_rpnl, attribute_funding)
+
+
+# Adds the exact terms of a batch to running terms, new keys are appended in order of first appearance
+# Running terms stay exact so totals round exactly like the ones of the full history
+def _accumulate(terms: Dict[str, List[float]], batch: Dict[str, List[float]]) -> None:
+    for key, batch_terms in batch.items():
+        terms[key] = _exact_terms(terms.get(key, []) + batch_terms)
+
+
+# Keeps running per market aggregates so summaries are updated from new fills instead of the full history
+# Batches must be passed in time order, each one costs O(batch + fills of the open trade)
+# Funding can be added before or after the fills of the same period, it is attributed to closed trades as soon as both are known
+# and only payments that can still fall inside the open or a future trade are kept
+# Returns the same tables as get_futures_summary, get_spot_summary and get_futures_trades_by_market
+# Volume, fee and funding totals are summed exactly so batches round like the full history
+class SummaryEngine(object):
+
+    def __init__(self, fixed_point: bool = False, registry: MarketRegistry = None) -> None:
+        self._fixed_point = fixed_point
+        self._registry = registry
+        # Exact terms of the volume and fee totals of each market and of the funding of each future
+        self._futures_terms: Dict[str, Dict[str, List[float]]] = {}
+        self._spot_terms: Dict[str, Dict[str, List[float]]] = {}
+        self._funding_terms: Dict[str, List[float]] = {}
+        self._open_positions = pd.DataFrame(columns=['future', 'cost'])
+        # Fills of the trade still open in each market, as returned by preprocess_fills
+        self._open_fills: Dict[str, pd.DataFrame] = {}
+        self._delta: Dict[str, Any] = {}
+        # Closed trades of each market with their funding and how many have been closed so far
+        self._closed_trades: Dict[str, List[pd.DataFrame]] = {}
+        self._trade_count: Dict[str, int] = {}
+        # Time of the last fill of each market and the start of its open trade, or the last fill time if none is open
+        # Payments before the horizon can only belong to closed trades
+        self._last_fill: Dict[str, pd.Timestamp] = {}
+        self._horizon: Dict[str, pd.Timestamp] = {}
+        self._pending_funding: Dict[str, pd.DataFrame] = {}
+
+    # Raw fills in the format returned by /fills
+    def add_fills(self, fills: pd.DataFrame) -> None:
+        self.add_processed_fills(*preprocess_fills(fills, self._fixed_point, self._registry)[:3])
+
+    # Fills already processed by preprocess_fills, ie one month loaded from a HistoryArchive
+    def add_processed_fills(self, spot: pd.DataFrame, futures: pd.DataFrame, futures_by_market: Dict[str, pd.DataFrame]) -> None:
+        for terms, batch in ((self._futures_terms, _market_terms(futures, futures['fee'])), (self._spot_terms, _market_terms(spot, _spot_fees(spot)))):
+            for market, columns in batch.items():
+                _accumulate(terms.setdefault(market, {}), columns)
+        for market, df in futures_by_market.items():
+            self._add_market_fills(market, df)
+
+    # Raw funding payments in the format returned by /funding_payments
+    def add_funding(self, funding: pd.DataFrame) -> None:
+        funding = preprocess_funding(funding)
+        _accumulate(self._funding_terms, _group_terms(funding['payment'], funding['future']))
+        for future, payments in MarketFrames(funding, 'future').items():
+            # Payments up to the last fill may fall inside trades that are already closed
+            if future in self._last_fill:
+                late = payments[payments['time'] <= self._last_fill[future]]
+                if not late.empty:
+                    closed = self._closed(future)
+                    closed['funding'] += attribute_funding(closed, late)
+            if future in self._pending_funding:
+                payments = pd.concat([self._pending_funding[future], payments])
+            self._pending_funding[future] = self._prune_funding(future, payments)
+
+    def set_open_positions(self, open_positions: pd.DataFrame) -> None:
+        self._open_positions = open_positions
+
+    # Current position of a futures market
+    def delta(self, market: str) -> Any:
+        return self._delta[market]
+
+    # Fills of the trade still open in a market, marked by add_trades
+    def open_trade(self, market: str) -> pd.DataFrame:
+        return add_trades(self._open_fills[market])
+
+    def futures_summary(self) -> pd.DataFrame:
+        return _futures_summary(_terms_totals(self._futures_terms), _funding_totals(self._funding_terms), self._open_positions)
+
+    def spot_summary(self) -> pd.DataFrame:
+        return _spot_summary(_terms_totals(self._spot_terms))
+
+    # Trades that are not closed will not be shown
+    def futures_trades_by_market(self) -> Dict[str, pd.DataFrame]:
+        return {market: _add_rpnl(self._closed(market).copy()) for market in self._closed_trades}
+
+    # Closed trades of a market joined into one table
+    def _closed(self, market: str) -> pd.DataFrame:
+        closed = self._closed_trades[market]
+        if len(closed) > 1:
+            self._closed_trades[market] = closed = [pd.concat([t for t in closed if not t.empty] or closed[:1])]
+        return closed[0]
+
+    def _prune_funding(self, market: str, funding: pd.DataFrame) -> pd.DataFrame:
+        if market not in self._horizon:
+            return funding
+        return funding[funding['time'] >= self._horizon[market]]
+
+    # Only the open trade is marked again together with the new fills, closed trades are final
+    def _add_market_fills(self, market: str, fills: pd.DataFrame) -> None:
+        if market in self._open_fills:
+            fills = pd.concat([self._open_fills.pop(market), fills])
+        fills = add_trades(fills)
+
+        last = fills['trade_nr'].iloc[-1]
+        self._delta[market] = fills['delta'].iloc[-1]
+        is_open = self._delta[market] != 0
+        closed = fills[fills['trade_nr'] != last] if is_open else fills
+
+        trades = _trades_table(closed)
+        trades.index += self._trade_count.get(market, 0)
+        trades['funding'] = attribute_funding(trades, self._pending_funding.get(market, pd.DataFrame(columns=['time', 'payment'])))
+        self._closed_trades.setdefault(market, []).append(trades)
+        self._trade_count[market] = self._trade_count.get(market, 0) + len(trades)
+
+        self._last_fill[market] = fills['time'].iloc[-1]
+        self._horizon[market] = self._last_fill[market]
+        if is_open:
+            # Back to the preprocess_fills format, sizes unsigned and marks dropped
+            open_fills = fills[fills['trade_nr'] == last].drop(columns=['delta', 'split_fill', 'trade_nr'])
+            open_fills['size'] = open_fills['size'].abs()
+            self._open_fills[market] = open_fills
+            self._horizon[market] = open_fills['time'].iloc[0]
+        if market in self._pending_funding:
+            self._pending_funding[market] = self._prune_funding(market, self._pending_funding[market])
+
+
+# Summaries of an archived history processed one month at a time
+# Memory is bounded by the busiest month plus open trades, closed trade tables and funding not attributed yet
+def summarize_archive(archive: HistoryArchive, open_positions: pd.DataFrame = None) -> SummaryEngine:
+    engine = SummaryEngine()
+    for (spot, futures, futures_by_market, _), funding in archive.iter_months():
+        if not funding.empty:
+            engine.add_funding(funding)
+        if not futures.empty or not spot.empty:
+            engine.add_processed_fills(spot, futures, futures_by_market)
+    if open_positions is not None:
+        engine.set_open_positions(open_positions)
+    return engine
@@ -1,9 +1,13 @@
-from typing import Tuple, Dict
+import asyncio
+from typing import Tuple, Dict, List, Iterator
 import pandas as pd
 from ftx.clients.rest_client import FtxAuth, FtxClient
-from ftx.data._wranglers import preprocess_fills, preprocess_funding
+from ftx.clients.async_client import AsyncFtxClient
+from ftx.data._wranglers import FILLS_SCHEMA, preprocess_fills, preprocess_funding
+from ftx.data.markets import MarketRegistry
+from ftx.data.store import HistoryStore
 
-_FILLS = ['fee', 'feeCurrency', 'feeRate', 'future', 'id', 'liquidity', 'market', 'baseCurrency', 'quoteCurrency', ' orderId', 'tradeId', 'price', 'size', 'side', 'time', 'type']
+_FILLS = list(FILLS_SCHEMA)
 
 _FUNDING = ['future', 'id', 'payment', 'time']
 
@@ -12,25 +16,72 @@ _OPEN_POSITIONS = [
     'recentAverageOpenPrice', 'recentBreakEvenPrice', 'recentPnl', 'shortOrderSize', 'side', 'size', 'unrealizedPnl'
 ]
 
+
 # Set proper format for empty dataframe if account has no history.
+# Only the _FILLS columns are read from the records
+def _fills_frame(fills: List[Dict]) -> pd.DataFrame:
+    return pd.DataFrame(fills, columns=_FILLS)
 
 
-def fills_history(client: FtxClient) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
-    df = pd.DataFrame(client.get_all_fills())
+def _funding_frame(funding: List[Dict]) -> pd.DataFrame:
+    df = pd.DataFrame(funding)
     if df.columns.empty:
-        df = pd.DataFrame(columns=_FILLS)
-    return preprocess_fills(df)
+        df = pd.DataFrame(columns=_FUNDING)
+    return df
 
 
-def funding_history(client: FtxClient) -> pd.DataFrame:
-    df = pd.DataFrame(client.get_all_funding_payments())
+def _positions_frame(positions: List[Dict]) -> pd.DataFrame:
+    df = pd.DataFrame(positions)
     if df.columns.empty:
-        df = pd.DataFrame(columns=_FUNDING)
-    return preprocess_funding(df)
+        df = pd.DataFrame(columns=_OPEN_POSITIONS)
+    return df
+
+
+# With a store only fills newer than the stored ones are downloaded, the full history is read from the store
+# Size precisions come from the registry, the static table when none is given
+def fills_history(client: FtxClient, store: HistoryStore = None,
+                  registry: MarketRegistry = None) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+    if store is None:
+        return preprocess_fills(_fills_frame(client.get_all_fills()), registry=registry)
+    store.sync_fills(client)
+    return preprocess_fills(_fills_frame(store.records('fills', client.auth.subaccount, key=client.auth.key_id)), registry=registry)
+
+
+def funding_history(client: FtxClient, store: HistoryStore = None) -> pd.DataFrame:
+    if store is None:
+        return preprocess_funding(_funding_frame(client.get_all_funding_payments()))
+    store.sync_funding(client)
+    return preprocess_funding(_funding_frame(store.records('funding', client.auth.subaccount, key=client.auth.key_id)))
+
+
+# Yields raw fills in DataFrame chunks of at most chunk_size rows, newest first
+# Only one chunk and the current page are held in memory at a time
+def iter_fills_frames(client: FtxClient, chunk_size: int = 10000, **kwargs) -> Iterator[pd.DataFrame]:
+    return _iter_frames(client.iter_fills(**kwargs), chunk_size)
+
+
+def iter_funding_frames(client: FtxClient, chunk_size: int = 10000, **kwargs) -> Iterator[pd.DataFrame]:
+    return _iter_frames(client.iter_funding_payments(**kwargs), chunk_size)
+
+
+def _iter_frames(pages: Iterator[List[Dict]], chunk_size: int) -> Iterator[pd.DataFrame]:
+    chunk = []
+    for page in pages:
+        chunk.extend(page)
+        while len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk[:chunk_size])
+            chunk = chunk[chunk_size:]
+    if chunk:
+        yield pd.DataFrame(chunk)
 
 
 def open_positions(client: FtxClient, *args) -> pd.DataFrame:
-    df = pd.DataFrame(client.get_positions(*args))
-    if df.columns.empty:
-        df = pd.DataFrame(columns=_OPEN_POSITIONS)
-    return df
\ No newline at end of file
+    return _positions_frame(client.get_positions(*args))
+
+
+# Downloads fills, funding payments and open positions concurrently
+# Returns the same frames as fills_history, funding_history and open_positions
+async def account_history(client: AsyncFtxClient,
+                          registry: MarketRegistry = None) -> Tuple[Tuple[pd.DataFrame, pd.DataFrame, Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]], pd.DataFrame, pd.DataFrame]:
+    fills, funding, positions = await asyncio.gather(client.get_all_fills(), client.get_all_funding_payments(), client.get_positions())
+    return preprocess_fills(_fills_frame(fills), registry=registry), preprocess_funding(_funding_frame(funding)), _positions_frame(positions)
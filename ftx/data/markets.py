@@ -0,0 +1,138 @@
+import json
+import os
+import time
+from decimal import Decimal
+from typing import Any, Dict, List
+import numpy as np
+import pandas as pd
+from requests import RequestException
+import ftx.data._precisions as prec
+from ftx.clients.rest_client import ApiError, FtxClient
+
+# Fields kept from /futures and /markets records
+_FIELDS = ['name', 'type', 'underlying', 'baseCurrency', 'quoteCurrency', 'sizeIncrement', 'priceIncrement']
+
+
+# Number of decimals of an increment, ie 4 for 0.0001 and 0 for 25
+def increment_precision(increment: float) -> int:
+    return max(0, -Decimal(str(increment)).normalize().as_tuple().exponent)
+
+
+# Root of a market name, ie BTC for BTC-PERP, BTC-0626 or BTC/USD
+def market_root(market: str) -> str:
+    return market.split('-')[0].split('/')[0]
+
+
+# Market metadata with precisions derived from the size and price increments returned by /futures and /markets
+# Markets are held in arrays sorted by name, lookups factorize the market column and search each unique market once
+# Markets that are not listed anymore, ie expired futures, use the precision of their underlying, then the static table
+class MarketRegistry(object):
+
+    def __init__(self, markets: List[Dict] = ()) -> None:
+        frame = pd.DataFrame(list(markets), columns=_FIELDS).drop_duplicates('name', keep='last').sort_values('name')
+        self._markets = frame.set_index('name', drop=False)
+        self._names = frame['name'].to_numpy(dtype='object')
+        self._precisions = {
+            'size': np.array([increment_precision(x) for x in frame['sizeIncrement']], dtype='int64'),
+            'price': np.array([increment_precision(x) for x in frame['priceIncrement']], dtype='int64'),
+        }
+        # Largest precision of the listed futures of each underlying, rounding to more decimals never drops digits
+        futures = (frame['type'] != 'spot').to_numpy()
+        roots = frame['underlying'].fillna(frame['name'].map(market_root)).to_numpy()[futures]
+        self._root_precisions = {
+            kind: pd.Series(values[futures], index=roots, dtype='int64').groupby(level=0).max().to_dict()
+            for kind, values in self._precisions.items()
+        }
+        self._static = {'size': prec.FUTURES_SIZE, 'price': prec.FUTURES_PRICE}
+
+    # Registry from a cache file younger than ttl seconds, otherwise from the client and written to the cache
+    # Without a client or when the API can not be reached a stale cache is used, then the static table
+    @classmethod
+    def load(cls, client: FtxClient = None, cache_path: str = None, ttl: float = 86400.0) -> 'MarketRegistry':
+        cached = cls._read_cache(cache_path)
+        if cached is not None and time.time() - cached['time'] < ttl:
+            return cls(cached['markets'])
+        if client is not None:
+            try:
+                markets = cls._fetch(client)
+            except (ApiError, RequestException):
+                markets = None
+            if markets is not None:
+                cls._write_cache(cache_path, markets)
+                return cls(markets)
+        return cls(cached['markets'] if cached is not None else ())
+
+    # /markets lists spot and futures markets, /futures adds the underlying of futures
+    @staticmethod
+    def _fetch(client: FtxClient) -> List[Dict]:
+        markets = {m['name']: {f: m.get(f) for f in _FIELDS} for m in client.list_markets()}
+        for future in client.list_futures():
+            market = markets.setdefault(future['name'], {f: None for f in _FIELDS})
+            market.update({f: future[f] for f in _FIELDS if future.get(f) is not None})
+        return list(markets.values())
+
+    @staticmethod
+    def _read_cache(path: str) -> Dict[str, Any]:
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # Written to a temporary file first so concurrent readers never see a partial cache
+    @staticmethod
+    def _write_cache(path: str, markets: List[Dict]) -> None:
+        if path is None:
+            return
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'time': time.time(), 'markets': markets}, f)
+        os.replace(f'{path}.tmp', path)
+
+    def __contains__(self, market: str) -> bool:
+        return market in self._markets.index
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    # Metadata of a listed market, None fields are not returned by the API for that market type
+    def info(self, market: str) -> Dict[str, Any]:
+        return self._markets.loc[market].to_dict()
+
+    def size_precision(self, markets: pd.Series) -> pd.Series:
+        return self._lookup(markets, 'size')
+
+    def price_precision(self, markets: pd.Series) -> pd.Series:
+        return self._lookup(markets, 'price')
+
+    # Precision of every row, raises KeyError listing the roots of unknown markets
+    def _lookup(self, markets: pd.Series, kind: str) -> pd.Series:
+        codes, uniques = pd.factorize(markets)
+        uniques = np.asarray(uniques, dtype='object')
+        precisions = np.zeros(len(uniques), dtype='int64')
+        found = np.zeros(len(uniques), dtype='bool')
+        if len(self._names):
+            positions = np.searchsorted(self._names, uniques).clip(0, len(self._names) - 1)
+            found = self._names[positions] == uniques
+            precisions[found] = self._precisions[kind][positions[found]]
+
+        unknown = []
+        for i in np.flatnonzero(~found):
+            root = market_root(uniques[i])
+            precision = self._root_precisions[kind].get(root, self._static[kind].get(root))
+            if precision is None:
+                unknown.append(root)
+            else:
+                precisions[i] = precision
+        if unknown:
+            raise KeyError(f'No precision for futures {", ".join(sorted(set(unknown)))}')
+        return pd.Series(precisions[codes], index=markets.index)
+
+
+_STATIC = MarketRegistry()
+
+
+# Registry holding no listed markets, precisions come from the static table
+def static_registry() -> MarketRegistry:
+    return _STATIC
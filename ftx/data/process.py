@@ -1,140 +1,237 @@
+import heapq
+import itertools
+import math
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Tuple
 import pandas as pd
 import numpy as np
 from ftx.clients.rest_client import FtxAuth, FtxClient
-from ftx.data._wranglers import add_trades, preprocess_fills
+from ftx.data._wranglers import LazyMapping, MarketFrames, add_trades, fixed_point, preprocess_fills
+from ftx.metrics import stage
 
 
-# Account summary for all traded futures
-def get_futures_summary(futures_fills: pd.DataFrame, funding: pd.DataFrame, open_positions: pd.DataFrame) -> pd.DataFrame:
+_TOTALS = ['Volume', 'TakerVolume', 'MakerVolume', 'SellVolume', 'BuyVolume', 'Fees']
+_SIDE_TOTALS = {'sell': 'SellVolume', 'buy': 'BuyVolume'}
+_LIQUIDITY_TOTALS = {'taker': 'TakerVolume', 'maker': 'MakerVolume'}
+
+
+# Exact sum of values as floats that add up to it without any rounding error, the largest first
+# Terms of several batches can be joined and summed again, math.fsum of them is the correctly rounded sum of every value
+def _exact_terms(values: Iterable[float]) -> List[float]:
+    values = list(values)
+    terms = []
+    while True:
+        term = math.fsum(itertools.chain(values, (-t for t in terms)))
+        if term == 0.0:
+            return terms
+        terms.append(term)
+
+
+# Exact terms of values per group, groups keep their order of first appearance
+def _group_terms(values: pd.Series, by) -> Dict:
+    groups = values.astype('float').groupby(by, sort=False, observed=True, dropna=False)
+    return {key: _exact_terms(group.to_numpy()) for key, group in groups}
+
+
+# Exact volume and fee terms per market from a single groupby pass over market x side x liquidity
+# Markets keep their order of first appearance
+def _market_terms(fills: pd.DataFrame, fees: pd.Series) -> Dict[str, Dict[str, List[float]]]:
+    terms = {market: {column: [] for column in _TOTALS} for market in fills['market'].unique()}
+    for (market, side, liquidity), volume in _group_terms(fills['volume'], [fills['market'], fills['side'], fills['liquidity']]).items():
+        columns = terms[market]
+        for column in ('Volume', _SIDE_TOTALS.get(side), _LIQUIDITY_TOTALS.get(liquidity)):
+            if column is not None:
+                columns[column] = columns[column] + volume
+    for market, fee in _group_terms(fees, fills['market']).items():
+        terms[market]['Fees'] = fee
+    return terms
+
+
+# Unrounded totals per market, summed exactly so batches and the full history round the same way
+def _terms_totals(terms: Dict[str, Dict[str, List[float]]]) -> pd.DataFrame:
+    return pd.DataFrame([[math.fsum(columns[column]) for column in _TOTALS] for columns in terms.values()],
+                        index=pd.Index(list(terms), dtype='object'), columns=_TOTALS, dtype='float')
+
+
+# Unrounded funding per future, summed exactly like the market totals
+def _funding_totals(terms: Dict[str, List[float]]) -> pd.Series:
+    return pd.Series({future: math.fsum(payments) for future, payments in terms.items()}, dtype='float')
+
+
+def _round_totals(totals: pd.DataFrame) -> pd.DataFrame:
+    return totals.round({'Volume': 2, 'TakerVolume': 2, 'MakerVolume': 2, 'SellVolume': 2, 'BuyVolume': 2, 'Fees': 4})
+
 
-    active_markets = futures_fills['market'].unique()
-    futures_summary = pd.DataFrame(columns=['Volume', 'TakerVolume', 'MakerVolume', 'SellVolume', 'BuyVolume', 'Fees', 'Funding'])
-
-    for market in active_markets:
-        active_market_df = futures_fills[futures_fills['market'] == market]
-        # Subtract any open shorts from the total sold value
-        open_short_value = (lambda x: np.float(0) if x.empty else np.float(x))(np.minimum(open_positions[open_positions['future'] == market]['cost'], 0))
-        # Subtract any open longs from the total bought value
-        open_long_value = (lambda x: np.float(0) if x.empty else np.float(x))(np.maximum(open_positions[open_positions['future'] == market]['cost'], 0))
-
-        market_summary = pd.Series(
-            {
-                "Volume": active_market_df['volume'].sum().round(2),
-                "TakerVolume": active_market_df[active_market_df['liquidity'] == 'taker']['volume'].sum().round(2),
-                "MakerVolume": active_market_df[active_market_df['liquidity'] == 'maker']['volume'].sum().round(2),
-                "SellVolume": active_market_df[active_market_df['side'] == 'sell']['volume'].sum().round(2) + open_short_value,
-                "BuyVolume": active_market_df[active_market_df['side'] == 'buy']['volume'].sum().round(2) - open_long_value,
-                "Fees": active_market_df['fee'].sum().round(4),
-                "Funding": funding[funding['future'] == market]['payment'].sum().round(4)
-            },
-            name=market)
-
-        futures_summary = futures_summary.append(market_summary)
-
-    cummulative = pd.Series(
-        {
-            "Volume": futures_summary['Volume'].sum(),
-            "TakerVolume": futures_summary['TakerVolume'].sum(),
-            "MakerVolume": futures_summary['MakerVolume'].sum(),
-            "SellVolume": futures_summary['SellVolume'].sum(),
-            "BuyVolume": futures_summary['BuyVolume'].sum(),
-            "Fees": futures_summary['Fees'].sum(),
-            "Funding": futures_summary['Funding'].sum()
-        },
-        name="TOTAL")
-    futures_summary = futures_summary.append(cummulative)
+# Adds open positions, funding, the TOTAL row and PNL to per market totals
+def _futures_summary(totals: pd.DataFrame, funding_totals: pd.Series, open_positions: pd.DataFrame) -> pd.DataFrame:
+    futures_summary = _round_totals(totals)
+    markets = futures_summary.index
+
+    # Subtract any open shorts from the total sold value and any open longs from the total bought value
+    open_cost = open_positions.groupby('future', observed=True)['cost'].sum().reindex(markets, fill_value=0.0).astype('float')
+    futures_summary['SellVolume'] += np.minimum(open_cost, 0)
+    futures_summary['BuyVolume'] -= np.maximum(open_cost, 0)
+    futures_summary['Funding'] = funding_totals.reindex(markets, fill_value=0.0).astype('float').round(4)
+
+    futures_summary.loc['TOTAL'] = futures_summary.sum()
     futures_summary['RawPNL'] = futures_summary['SellVolume'] - futures_summary['BuyVolume']
     futures_summary['RPNL'] = futures_summary['RawPNL'] - futures_summary['Fees'] - futures_summary['Funding']
 
     return futures_summary
 
 
-# Account summary for all traded spot markets
-def get_spot_summary(spot_fills: pd.DataFrame) -> pd.DataFrame:
+# Account summary for all traded futures
+@stage('get_futures_summary')
+def get_futures_summary(futures_fills: pd.DataFrame, funding: pd.DataFrame, open_positions: pd.DataFrame) -> pd.DataFrame:
+    totals = _terms_totals(_market_terms(futures_fills, futures_fills['fee']))
+    return _futures_summary(totals, _funding_totals(_group_terms(funding['payment'], funding['future'])), open_positions)
+
+
+# Use the quote currency as the fee currency ie ETH/BTC fees are denominated in BTC
+# Convert fees from fee currency to quote currency where needed
+def _spot_fees(spot_fills: pd.DataFrame) -> pd.Series:
+    markets = pd.Series(spot_fills['market'].unique())
+    quote_currency = spot_fills['market'].map(dict(zip(markets, markets.astype('str').str.split('/').str[1]))).astype('str')
+    fees = spot_fills['fee'].where(spot_fills['feeCurrency'].astype('str') == quote_currency, spot_fills['fee'] * spot_fills['price'])
+    return fees.astype('float')
 
-    active_markets = spot_fills['market'].unique()
-    spot_summary = pd.DataFrame(columns=[
-        'Volume',
-        'TakerVolume',
-        'MakerVolume',
-        'SellVolume',
-        'BuyVolume',
-        'Fees',
-    ])
-
-    for market in active_markets:
-        active_market_df = spot_fills[spot_fills['market'] == market]
-        fee_currency = market.split('/')[1]
-        market_summary = pd.Series(
-            {
-                "Volume": active_market_df['volume'].sum().round(2),
-                "TakerVolume": active_market_df[active_market_df['liquidity'] == 'taker']['volume'].sum().round(2),
-                "MakerVolume": active_market_df[active_market_df['liquidity'] == 'maker']['volume'].sum().round(2),
-                "SellVolume": active_market_df[active_market_df['side'] == 'sell']['volume'].sum().round(2),
-                "BuyVolume": active_market_df[active_market_df['side'] == 'buy']['volume'].sum().round(2),
-                # Use the quote currency as the fee currency ie ETH/BTC fees are denominated in BTC
-                # Convert fees from fee currency to quote currency where needed
-                "Fees": active_market_df.apply(lambda row: row.fee * row.price if row.feeCurrency != fee_currency else row.fee, axis=1).sum().round(4),
-                "FeeCurrency": fee_currency,
-            },
-            name=market)
-
-        spot_summary = spot_summary.append(market_summary)
-        active_market_df.apply(lambda row: row.fee * row.price if row.feeCurrency != fee_currency else row.fee, axis=1)
 
+def _spot_summary(totals: pd.DataFrame) -> pd.DataFrame:
+    spot_summary = _round_totals(totals)
+    spot_summary['FeeCurrency'] = spot_summary.index.str.split('/').str[1]
     return spot_summary
 
 
+# Account summary for all traded spot markets
+@stage('get_spot_summary')
+def get_spot_summary(spot_fills: pd.DataFrame) -> pd.DataFrame:
+    return _spot_summary(_terms_totals(_market_terms(spot_fills, _spot_fees(spot_fills))))
+
+
+# Funding paid during each trade, payments at the exact start or end time are included
+# Payments are accumulated once and each trade window is resolved with two binary searches
+@stage('attribute_funding')
+def attribute_funding(trades: pd.DataFrame, funding: pd.DataFrame) -> pd.Series:
+    funding = funding.sort_values('time')
+    times = funding['time'].values
+    cumulative = np.concatenate([[0.0], funding['payment'].to_numpy(dtype='float').cumsum()])
+    first = np.searchsorted(times, trades['start'].values, side='left')
+    last = np.searchsorted(times, trades['end'].values, side='right')
+    return pd.Series(cumulative[last] - cumulative[first], index=trades.index, name='funding')
+
+
+# Per trade totals of fills marked by add_trades, indexed by trade_nr
+# The last trade is included even if the position is still open
+def _trades_table(df: pd.DataFrame) -> pd.DataFrame:
+    volume = df.groupby('trade_nr')['volume'].sum()
+    fees = df.groupby('trade_nr')['fee'].sum()
+    value = df.groupby(['trade_nr', 'side'], observed=True)['volume'].sum().unstack().reindex(columns=['buy', 'sell'])
+    # Trades with fills on one side only have no PNL yet
+    raw_pnl = (value['sell'] - value['buy']).dropna()
+    raw_pnl.name = 'raw_pnl'
+    start_time = df.groupby('trade_nr')['time'].min()
+    start_time.name = 'start'
+    end_time = df.groupby('trade_nr')['time'].max()
+    end_time.name = 'end'
+    duration = end_time - start_time
+    duration.name = 'duration'
+    executions = df.groupby('trade_nr')['time'].count()
+    executions.name = 'executions'
+
+    return pd.concat([
+        raw_pnl,
+        fees,
+        volume,
+        executions,
+        start_time,
+        end_time,
+        duration,
+    ], axis=1)
+
+
+# Adds funding and realized PNL to a trades table
+def _add_funding(trades: pd.DataFrame, funding: pd.DataFrame) -> pd.DataFrame:
+    trades['funding'] = attribute_funding(trades, funding)
+    return _add_rpnl(trades)
+
+
+# Adds realized PNL to a trades table with funding and orders the columns
+def _add_rpnl(trades: pd.DataFrame) -> pd.DataFrame:
+    trades['rpnl'] = trades['raw_pnl'] - trades['fee'] - trades['funding']
+    return trades[[
+        'raw_pnl',
+        'fee',
+        'funding',
+        'rpnl',
+        'executions',
+        'volume',
+        'start',
+        'end',
+        'duration',
+    ]]
+
+
+# Closed trades of one market, the last trade is dropped if the position is still open
+# Timed as the get_futures_trades_by_market stage when it actually runs, on first access or in a pool worker
+@stage('get_futures_trades_by_market')
+def _market_trades(fills: pd.DataFrame, funding: pd.DataFrame) -> pd.DataFrame:
+    df = add_trades(fills)
+    trades = _add_funding(_trades_table(df), funding)
+
+    # Delete last trade if position still open
+    if df.iloc[-1]['delta'] != 0:
+        trades.drop(df.iloc[-1]['trade_nr'], inplace=True)
+
+    return trades
+
+
+# Columns add_trades and the trades table need, sizes are sent as fixed point so no Decimal objects are pickled
+_TASK_COLUMNS = ['id', 'orderId', 'tradeId', 'market', 'side', 'price', 'size', 'size_scale', 'fee', 'feeRate', 'volume', 'time']
+
+
+# Decimal sizes of a market are rounded to one precision, its scale is read from the exponent of the first size
+def _task_fills(fills: pd.DataFrame) -> pd.DataFrame:
+    if 'size_scale' not in fills:
+        scale = np.int64(10**-fills['size'].iloc[0].as_tuple().exponent) if len(fills) else np.int64(1)
+        fills = fills.assign(size_scale=scale, size=fixed_point(fills['size'], scale))
+    return fills[_TASK_COLUMNS]
+
+
+# Runs in a worker process, tasks are (market, fills, funding)
+def _trades_chunk(tasks: List[Tuple[str, pd.DataFrame, pd.DataFrame]]) -> List[Tuple[str, pd.DataFrame]]:
+    return [(market, _market_trades(fills, funding)) for market, fills, funding in tasks]
+
+
+# Longest processing time first: markets are handed out by decreasing fill count to the least loaded chunk
+def _balanced_chunks(sizes: Dict[str, int], chunks: int) -> List[List[str]]:
+    loads = [(0, i) for i in range(chunks)]
+    assigned: List[List[str]] = [[] for _ in range(chunks)]
+    for market in sorted(sizes, key=sizes.get, reverse=True):
+        load, i = heapq.heappop(loads)
+        assigned[i].append(market)
+        heapq.heappush(loads, (load + sizes[market], i))
+    return [markets for markets in assigned if markets]
+
+
 # Trades that are not closed will not be shown
-def get_futures_trades_by_market(fills_by_market: pd.DataFrame, funding: pd.DataFrame) -> pd.DataFrame:
-    fills_by_market = {market: add_trades(df) for market, df in fills_by_market.items()}
+# Trades of a market are computed when it is first accessed, reports touching a few markets only pay for those
+# workers > 1 computes every market up front on a process pool and returns a dict in the same market order
+def get_futures_trades_by_market(fills_by_market: Mapping, funding: pd.DataFrame, workers: int = 1) -> Mapping:
+    funding_by_future = MarketFrames(funding, 'future')
+
+    def market_funding(df: pd.DataFrame) -> pd.DataFrame:
+        future = df['market'].iloc[0]
+        return funding_by_future[future] if future in funding_by_future else funding.iloc[:0]
+
+    if workers <= 1:
+        return LazyMapping(fills_by_market, lambda market: _market_trades(fills_by_market[market], market_funding(fills_by_market[market])))
+
+    chunks = _balanced_chunks({market: len(df) for market, df in fills_by_market.items()}, workers)
     trades_by_market = {}
-    for future, df in fills_by_market.items():
-
-        volume = df.groupby('trade_nr')['volume'].sum()
-        fees = df.groupby('trade_nr')['fee'].sum()
-        value = df.groupby(['trade_nr', 'side'])['volume'].sum()
-        raw_pnl = value.groupby('trade_nr').diff().droplevel('side').dropna()
-        raw_pnl.name = 'raw_pnl'
-        start_time = df.groupby('trade_nr')['time'].min()
-        start_time.name = 'start'
-        end_time = df.groupby('trade_nr')['time'].max()
-        end_time.name = 'end'
-        duration = end_time - start_time
-        duration.name = 'duration'
-        executions = df.groupby('trade_nr')['time'].count()
-        executions.name = 'executions'
-
-        f = funding[funding['future'] == df['market'].iloc[0]].copy()
-        f = f.set_index('time').sort_index()
-
-        trades = pd.concat([
-            raw_pnl,
-            fees,
-            volume,
-            executions,
-            start_time,
-            end_time,
-            duration,
-        ], axis=1)
-        trades['funding'] = trades.apply(lambda x: f['payment'][x.start:x.end].sum(), axis=1)
-        trades['rpnl'] = trades['raw_pnl'] - trades['fee'] - trades['funding']
-        trades = trades[[
-            'raw_pnl',
-            'fee',
-            'funding',
-            'rpnl',
-            'executions',
-            'volume',
-            'start',
-            'end',
-            'duration',
-        ]]
-
-        # Delete last trade if position still open
-        if df.iloc[-1]['delta'] != 0:
-            trades.drop(df.iloc[-1]['trade_nr'], inplace=True)
-
-        trades_by_market[future] = trades
-
-    return trades_by_market
\ No newline at end of file
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tasks = [[(market, _task_fills(fills_by_market[market]), market_funding(fills_by_market[market])[['time', 'payment']]) for market in chunk]
+                 for chunk in chunks]
+        for result in executor.map(_trades_chunk, tasks):
+            trades_by_market.update(result)
+    return {market: trades_by_market[market] for market in fills_by_market}
\ No newline at end of file
@@ -0,0 +1,64 @@
+import json
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Tuple
+from ftx.clients.rest_client import FtxClient
+
+
+# Local SQLite copy of fills and funding payments, keyed by API key and subaccount (main account is '')
+# The API key is stored as FtxAuth.key_id, a hash, so several keys can share a file without sharing watermarks
+# Records are kept exactly as returned by the API so they can be loaded into the same frames
+class HistoryStore(object):
+    _TABLES = ('fills', 'funding')
+
+    def __init__(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            for table in HistoryStore._TABLES:
+                columns = [row[1] for row in self._conn.execute(f'PRAGMA table_info({table})')]
+                # Files written before records were keyed by API key, their rows are kept under the empty key
+                if columns and 'key' not in columns:
+                    self._conn.execute(f'ALTER TABLE {table} RENAME TO {table}_unkeyed')
+                self._conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (key TEXT NOT NULL, account TEXT NOT NULL, id INTEGER NOT NULL, time REAL NOT NULL, '
+                                   f'record TEXT NOT NULL, PRIMARY KEY (key, account, id))')
+                if columns and 'key' not in columns:
+                    self._conn.execute(f"INSERT INTO {table} SELECT '', account, id, time, record FROM {table}_unkeyed")
+                    self._conn.execute(f'DROP TABLE {table}_unkeyed')
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # Timestamp of the newest stored record, None if nothing is stored yet
+    def watermark(self, table: str, account: str = '', key: str = '') -> float:
+        return self._conn.execute(f'SELECT MAX(time) FROM {table} WHERE key = ? AND account = ?', (key, account)).fetchone()[0]
+
+    # Inserts records not stored yet, returns the number of new records
+    def insert(self, table: str, records: List[Dict], account: str = '', key: str = '') -> int:
+        rows = [(key, account, r['id'], datetime.fromisoformat(r['time']).timestamp(), json.dumps(r)) for r in records]
+        with self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(f'INSERT OR IGNORE INTO {table} VALUES (?, ?, ?, ?, ?)', rows)
+            return self._conn.total_changes - before
+
+    # Stored records, newest first like the API returns them
+    # start_time and end_time are timestamps in seconds, start inclusive and end exclusive so consecutive ranges do not overlap
+    def records(self, table: str, account: str = '', start_time: float = None, end_time: float = None, key: str = '') -> List[Dict]:
+        start_time = float('-inf') if start_time is None else start_time
+        end_time = float('inf') if end_time is None else end_time
+        rows = self._conn.execute(f'SELECT record FROM {table} WHERE key = ? AND account = ? AND time >= ? AND time < ? '
+                                  f'ORDER BY time DESC, id DESC', (key, account, start_time, end_time))
+        return [json.loads(r) for r, in rows]
+
+    # Only asks the API for records newer than the watermark
+    # The watermark second is requested again, records already stored are ignored by their id
+    def sync_fills(self, client: FtxClient) -> int:
+        account, key = client.auth.subaccount, client.auth.key_id
+        return self.insert('fills', client.get_all_fills(start_time=self.watermark('fills', account, key)), account, key)
+
+    def sync_funding(self, client: FtxClient) -> int:
+        account, key = client.auth.subaccount, client.auth.key_id
+        return self.insert('funding', client.get_all_funding_payments(start_time=self.watermark('funding', account, key)), account, key)
+
+    # Returns the number of new fills and funding payments
+    def sync(self, client: FtxClient) -> Tuple[int, int]:
+        return self.sync_fills(client), self.sync_funding(client)
@@ -0,0 +1,172 @@
+import json
+import time
+import threading
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Callable, Dict, List, Tuple
+
+# Upper bounds in seconds of the request latency histogram buckets, the last one catches everything
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# Metrics collecting pipeline stage timings, None while disabled
+_active: 'Metrics' = None
+
+
+# Collects request and pipeline metrics, safe to share between threads
+# Pass one to FtxClient(metrics=...) for requests and to enable() for the pandas stages
+class Metrics(object):
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            # endpoint -> bucket counts, summed seconds
+            self._latency: Dict[str, List[int]] = {}
+            self._latency_sum: Dict[str, float] = {}
+            # (endpoint, status) -> count
+            self._status: Dict[Tuple[str, int], int] = {}
+            self._bytes: Dict[str, int] = {}
+            self._retries: Dict[str, int] = {}
+            # endpoint -> paginations, pages, duplicates dropped, pages requested again with a larger limit
+            self._pages: Dict[str, List[int]] = {}
+            self._sleep = 0.0
+            # stage -> calls, seconds, rows
+            self._stages: Dict[str, List[float]] = {}
+            # endpoint -> cache hits, misses
+            self._cache: Dict[str, List[int]] = {}
+
+    def observe_request(self, endpoint: str, status: int, seconds: float, size: int) -> None:
+        with self._lock:
+            counts = self._latency.setdefault(endpoint, [0] * len(self._buckets))
+            counts[bisect_left(self._buckets, seconds)] += 1
+            self._latency_sum[endpoint] = self._latency_sum.get(endpoint, 0.0) + seconds
+            self._status[endpoint, status] = self._status.get((endpoint, status), 0) + 1
+            self._bytes[endpoint] = self._bytes.get(endpoint, 0) + size
+
+    def observe_retry(self, endpoint: str) -> None:
+        with self._lock:
+            self._retries[endpoint] = self._retries.get(endpoint, 0) + 1
+
+    # One finished pagination
+    def observe_pages(self, endpoint: str, pages: int, duplicates: int, widened: int = 0) -> None:
+        with self._lock:
+            totals = self._pages.setdefault(endpoint, [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += pages
+            totals[2] += duplicates
+            totals[3] += widened
+
+    # One lookup of a cached endpoint
+    def observe_cache(self, endpoint: str, hit: bool) -> None:
+        with self._lock:
+            counts = self._cache.setdefault(endpoint, [0, 0])
+            counts[not hit] += 1
+
+    # Time spent waiting on the rate limiter
+    def observe_sleep(self, seconds: float) -> None:
+        with self._lock:
+            self._sleep += seconds
+
+    def observe_stage(self, stage: str, seconds: float, rows: int) -> None:
+        with self._lock:
+            totals = self._stages.setdefault(stage, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': {
+                    endpoint: {
+                        'count': sum(counts),
+                        'seconds': self._latency_sum[endpoint],
+                        'buckets': {str(bound): count for bound, count in zip(self._buckets, counts)},
+                        'status': {str(status): n for (e, status), n in self._status.items() if e == endpoint},
+                        'bytes': self._bytes[endpoint],
+                        'retries': self._retries.get(endpoint, 0),
+                    }
+                    for endpoint, counts in self._latency.items()
+                },
+                'pagination': {endpoint: {'paginations': p[0], 'pages': p[1], 'duplicates': p[2], 'widened': p[3]} for endpoint, p in self._pages.items()},
+                'rate_limit_sleep_seconds': self._sleep,
+                'stages': {stage: {'calls': s[0], 'seconds': s[1], 'rows': s[2]} for stage, s in self._stages.items()},
+                'cache': {endpoint: {'hits': c[0], 'misses': c[1]} for endpoint, c in self._cache.items()},
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    # Prometheus text exposition format
+    def to_prometheus(self) -> str:
+        data = self.to_dict()
+        lines = [
+            '# TYPE ftx_request_duration_seconds histogram',
+        ]
+        for endpoint, r in data['requests'].items():
+            cumulative = 0
+            for bound, count in r['buckets'].items():
+                cumulative += count
+                le = '+Inf' if bound == 'inf' else bound
+                lines.append(f'ftx_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{le}"}} {cumulative}')
+            lines.append(f'ftx_request_duration_seconds_sum{{endpoint="{endpoint}"}} {r["seconds"]}')
+            lines.append(f'ftx_request_duration_seconds_count{{endpoint="{endpoint}"}} {r["count"]}')
+        lines.append('# TYPE ftx_responses_total counter')
+        for endpoint, r in data['requests'].items():
+            lines.extend(f'ftx_responses_total{{endpoint="{endpoint}",status="{status}"}} {n}' for status, n in r['status'].items())
+        lines.append('# TYPE ftx_response_bytes_total counter')
+        lines.extend(f'ftx_response_bytes_total{{endpoint="{endpoint}"}} {r["bytes"]}' for endpoint, r in data['requests'].items())
+        lines.append('# TYPE ftx_retries_total counter')
+        lines.extend(f'ftx_retries_total{{endpoint="{endpoint}"}} {r["retries"]}' for endpoint, r in data['requests'].items())
+        for name in ('paginations', 'pages', 'duplicates', 'widened'):
+            lines.append(f'# TYPE ftx_{name}_total counter')
+            lines.extend(f'ftx_{name}_total{{endpoint="{endpoint}"}} {p[name]}' for endpoint, p in data['pagination'].items())
+        lines.append('# TYPE ftx_rate_limit_sleep_seconds_total counter')
+        lines.append(f'ftx_rate_limit_sleep_seconds_total {data["rate_limit_sleep_seconds"]}')
+        for name in ('calls', 'seconds', 'rows'):
+            lines.append(f'# TYPE ftx_stage_{name}_total counter')
+            lines.extend(f'ftx_stage_{name}_total{{stage="{stage}"}} {s[name]}' for stage, s in data['stages'].items())
+        for name in ('hits', 'misses'):
+            lines.append(f'# TYPE ftx_cache_{name}_total counter')
+            lines.extend(f'ftx_cache_{name}_total{{endpoint="{endpoint}"}} {c[name]}' for endpoint, c in data['cache'].items())
+        return '\n'.join(lines) + '\n'
+
+
+# Starts collecting pipeline stage timings into metrics, returns it
+def enable(metrics: Metrics = None) -> Metrics:
+    global _active
+    _active = metrics or Metrics()
+    return _active
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+def active() -> Metrics:
+    return _active
+
+
+# Times a pipeline stage and counts the rows of its first argument
+# While disabled the only cost is a global lookup per call
+def stage(name: str) -> Callable:
+
+    def decorator(function: Callable) -> Callable:
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            metrics = _active
+            if metrics is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            metrics.observe_stage(name, time.perf_counter() - start, len(args[0]) if args and hasattr(args[0], '__len__') else 0)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,44 @@
+import pandas as pd
+
+# Signed fill sizes per market, one fill per hour
+SIZES = {
+    'BTC-PERP': [0.5, -0.2, -0.5, 0.2, 0.1, -0.1, 0.3],
+    'ETH-PERP': [1.0, -1.0, -2.0],
+}
+
+
+# Raw fills in the format returned by /fills
+def raw_fills(sizes=SIZES) -> pd.DataFrame:
+    rows = []
+    for market, signed_sizes in sizes.items():
+        for hour, size in enumerate(signed_sizes):
+            price = 100.0 + hour
+            rows.append({
+                'fee': abs(size) * price * 0.0007,
+                'feeCurrency': 'USD',
+                'feeRate': 0.0007,
+                'future': market,
+                'id': 1000 + len(rows),
+                'liquidity': 'taker',
+                'market': market,
+                'baseCurrency': None,
+                'quoteCurrency': None,
+                'orderId': 2000 + len(rows),
+                'tradeId': 3000 + len(rows),
+                'price': price,
+                'size': abs(size),
+                'side': 'buy' if size > 0 else 'sell',
+                'time': f'2020-01-01T{hour:02d}:00:00+00:00',
+                'type': 'order',
+            })
+    return pd.DataFrame(rows)
+
+
+# Raw funding payments in the format returned by /funding_payments
+def raw_funding() -> pd.DataFrame:
+    return pd.DataFrame({
+        'future': ['BTC-PERP'] * 6,
+        'id': range(6),
+        'payment': [0.1] * 6,
+        'time': [f'2020-01-01T{hour:02d}:30:00+00:00' for hour in range(6)],
+    })
@@ -0,0 +1,54 @@
+from unittest import TestCase
+from unittest.mock import patch
+from ftx.clients.rest_client import FtxAuth, FtxClient
+from ftx.clients.transport import Transport
+from ftx.data.accounts import subaccounts_history, subaccounts_futures_summary, subaccounts_spot_summary
+from ftx.metrics import Metrics
+from test.fixtures import raw_fills, raw_funding
+
+FILLS = {
+    'alpha': raw_fills({'BTC-PERP': [0.5, -0.5]}),
+    'beta': raw_fills({'BTC-PERP': [1.0, -1.0], 'ETH-PERP': [2.0]}),
+}
+
+
+class SubaccountsTestCase(TestCase):
+
+    @patch.object(FtxClient, 'get_positions', autospec=True)
+    @patch.object(FtxClient, 'get_all_funding_payments', autospec=True)
+    @patch.object(FtxClient, 'get_all_fills', autospec=True)
+    @patch.object(FtxClient, 'get_subaccounts')
+    def test_subaccounts_history(self, mock_get_subaccounts, mock_get_all_fills, mock_get_all_funding_payments, mock_get_positions):
+        mock_get_subaccounts.return_value = [{'nickname': 'alpha'}, {'nickname': 'beta'}]
+        mock_get_all_fills.side_effect = lambda c: FILLS[c.auth.subaccount].to_dict('records') if c.auth.subaccount else []
+        mock_get_all_funding_payments.side_effect = lambda c: raw_funding().to_dict('records') if c.auth.subaccount == 'alpha' else []
+        mock_get_positions.side_effect = lambda c: [{'future': 'ETH-PERP', 'cost': 200.0}] if c.auth.subaccount == 'beta' else []
+
+        metrics, transport = Metrics(), Transport(retries=5)
+        client = FtxClient(FtxAuth('key', 'secret'), metrics=metrics, transport=transport)
+        histories = subaccounts_history(client)
+        # The main account is discovered along with the subaccounts
+        self.assertEqual(list(histories), ['', 'alpha', 'beta'])
+        self.assertTrue(histories[''].futures_fills.empty)
+        # Subaccount clients share the metrics and transport of the client
+        self.assertEqual({(c.args[0].metrics, c.args[0].transport) for c in mock_get_all_fills.call_args_list}, {(metrics, transport)})
+        self.assertEqual(list(histories['beta'].futures_by_market), ['BTC-PERP', 'ETH-PERP'])
+        self.assertTrue(histories['beta'].funding.empty)
+
+        summaries, consolidated = subaccounts_futures_summary(histories)
+        self.assertEqual(list(summaries['alpha'].index), ['BTC-PERP', 'TOTAL'])
+        self.assertEqual(list(consolidated.index), ['BTC-PERP', 'ETH-PERP', 'TOTAL'])
+        self.assertAlmostEqual(consolidated.loc['BTC-PERP', 'Volume'], summaries['alpha'].loc['BTC-PERP', 'Volume'] + summaries['beta'].loc['BTC-PERP', 'Volume'])
+        self.assertAlmostEqual(consolidated.loc['TOTAL', 'Funding'], 0.6)
+        self.assertAlmostEqual(consolidated.loc['ETH-PERP', 'BuyVolume'], 0.0)
+
+        spot_summaries, spot_consolidated = subaccounts_spot_summary(histories)
+        self.assertTrue(spot_consolidated.empty)
+
+    # No subaccounts consolidate to empty summaries
+    def test_no_histories(self):
+        summaries, consolidated = subaccounts_futures_summary({})
+        self.assertEqual(summaries, {})
+        self.assertEqual(list(consolidated.index), ['TOTAL'])
+        self.assertEqual(consolidated.loc['TOTAL', 'Volume'], 0.0)
+        self.assertTrue(subaccounts_spot_summary({})[1].empty)
@@ -0,0 +1,93 @@
+import tempfile
+from importlib.util import find_spec
+from unittest import TestCase, skipUnless
+import pandas as pd
+from ftx.data._wranglers import preprocess_fills, preprocess_funding
+from ftx.data.archive import HistoryArchive
+from ftx.data.fetch import _fills_frame, _funding_frame
+from ftx.data.process import get_futures_trades_by_market
+from ftx.data.store import HistoryStore
+from benchmarks.synthetic import synthetic_fills, synthetic_funding
+
+
+@skipUnless(find_spec('pyarrow'), 'pyarrow is not installed')
+class HistoryArchiveTestCase(TestCase):
+
+    def setUp(self):
+        self.raw = synthetic_fills(3000, 20, days=90)
+        self.markets = sorted(self.raw['market'].unique())
+        self.funding = preprocess_funding(synthetic_funding(self.markets, days=90))
+        self.archive = HistoryArchive(tempfile.mkdtemp())
+
+    def test_fills_round_trip(self):
+        for fixed_point in (False, True):
+            fills = preprocess_fills(self.raw, fixed_point)
+            self.archive.save_fills(fills)
+            loaded = self.archive.load_fills()
+
+            pd.testing.assert_frame_equal(loaded[0], fills[0])
+            pd.testing.assert_frame_equal(loaded[1], fills[1])
+            self.assertEqual(list(loaded[2]), list(fills[2]))
+            self.assertEqual(list(loaded[3]), list(fills[3]))
+
+    def test_load_subset(self):
+        _, futures, _, _ = fills = preprocess_fills(self.raw)
+        self.archive.save_fills(fills)
+        start, end = pd.Timestamp('2020-02-10', tz='UTC'), pd.Timestamp('2020-03-05', tz='UTC')
+        market = futures['market'].iloc[0]
+
+        # Only February and March of the market are read
+        self.assertEqual(len(self.archive.tables('futures', [market], start.timestamp(), end.timestamp())), 2)
+        _, loaded, futures_by_market, spot_by_market = self.archive.load_fills([market], start.timestamp(), end.timestamp())
+        expected = futures[(futures['market'] == market) & (futures['time'] >= start) & (futures['time'] <= end)]
+        pd.testing.assert_frame_equal(loaded, expected)
+        self.assertEqual(list(futures_by_market), [market])
+        self.assertEqual(len(spot_by_market), 0)
+
+    def test_funding_and_trades_round_trip(self):
+        _, _, futures_by_market, _ = preprocess_fills(self.raw)
+        trades = dict(get_futures_trades_by_market(futures_by_market, self.funding))
+        self.archive.save_funding(self.funding)
+        self.archive.save_trades(trades)
+
+        pd.testing.assert_frame_equal(self.archive.load_funding(), self.funding)
+        loaded = self.archive.load_trades()
+        self.assertEqual(sorted(loaded), sorted(trades))
+        for market, df in trades.items():
+            pd.testing.assert_frame_equal(loaded[market], df)
+        self.assertTrue(self.archive.load_funding(['NEW-PERP']).empty)
+
+    # Kinds that were never saved load as empty frames
+    def test_load_nothing_saved(self):
+        spot, futures, futures_by_market, _ = self.archive.load_fills(start_time=0, end_time=2e9)
+        self.assertTrue(spot.empty and futures.empty)
+        self.assertEqual(len(futures_by_market), 0)
+        self.assertTrue(self.archive.load_funding().empty)
+        self.assertEqual(len(self.archive.load_trades()), 0)
+
+    # The archive is built one month of stored records at a time, the full history is never loaded
+    def test_append_by_month(self):
+        store = HistoryStore(':memory:')
+        self.addCleanup(store.close)
+        raw_funding = synthetic_funding(self.markets, days=90)
+        for table, df in (('fills', self.raw), ('funding', raw_funding)):
+            store.insert(table, df.astype('object').where(df.notnull(), None).to_dict('records'))
+
+        months = pd.date_range('2020-01-01', periods=4, freq='MS', tz='UTC')
+        for start, end in zip(months[:-1], months[1:]):
+            chunk = _fills_frame(store.records('fills', start_time=start.timestamp(), end_time=end.timestamp()))
+            self.assertLess(len(chunk), len(self.raw))
+            fills = preprocess_fills(chunk)
+            self.archive.append_fills(fills)
+            # Fills already archived are skipped
+            self.archive.append_fills(fills)
+            self.archive.append_funding(preprocess_funding(_funding_frame(store.records('funding', start_time=start.timestamp(), end_time=end.timestamp()))))
+
+        expected = preprocess_fills(self.raw)
+        loaded = self.archive.load_fills()
+        for kind in (0, 1):
+            pd.testing.assert_frame_equal(loaded[kind].reset_index(drop=True), expected[kind].reset_index(drop=True))
+        self.assertEqual(list(loaded[2]), list(expected[2]))
+        funding = self.archive.load_funding()
+        self.assertEqual(sorted(funding['id']), sorted(raw_funding['id']))
+        self.assertEqual(self.archive.months(), [202001, 202002, 202003])
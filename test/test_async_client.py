@@ -0,0 +1,53 @@
+import asyncio
+from unittest import TestCase
+from unittest.mock import patch
+from ftx.clients.rest_client import FtxClient
+from ftx.clients.async_client import AsyncFtxClient
+
+
+def fill(id, time):
+    return {'id': id, 'time': f'2020-01-01T00:00:{time:02d}+00:00'}
+
+
+class AsyncFtxClientTestCase(TestCase):
+
+    @patch.object(FtxClient, '_get')
+    def test_async_client__get(self, mock_client__get):
+        mock_client__get.return_value = 'data'
+        client = AsyncFtxClient()
+        self.assertEqual(asyncio.run(client._get('/')), 'data')
+        mock_client__get.assert_called_once_with('/', None)
+        client.close()
+
+    # Pages overlap on the boundary second, duplicates must be dropped
+    @patch.object(FtxClient, '_get')
+    def test_async_client_get_all_fills(self, mock_client__get):
+        first_page = [fill(i, 59 - i % 50) for i in range(100)]
+        second_page = [fill(99, 10), fill(100, 5)]
+        mock_client__get.side_effect = [first_page, second_page]
+        client = AsyncFtxClient()
+        fills = asyncio.run(client.get_all_fills())
+        self.assertEqual([f['id'] for f in fills], list(range(101)))
+        self.assertEqual(mock_client__get.call_count, 2)
+        client.close()
+
+    @patch.object(FtxClient, '_get')
+    def test_async_client_get_all_fills_by_market(self, mock_client__get):
+        mock_client__get.side_effect = lambda endpoint, params: [fill(params['market'], 0)]
+        client = AsyncFtxClient()
+        fills = asyncio.run(client.get_all_fills_by_market(['BTC-PERP', 'ETH-PERP']))
+        self.assertEqual(fills, {'BTC-PERP': [fill('BTC-PERP', 0)], 'ETH-PERP': [fill('ETH-PERP', 0)]})
+        client.close()
+
+    # Requests waiting on the concurrency limit work in every event loop the client is used in
+    @patch.object(FtxClient, '_get')
+    def test_async_client_several_loops(self, mock_client__get):
+        mock_client__get.return_value = []
+        client = AsyncFtxClient(concurrency=1)
+
+        async def positions():
+            return await asyncio.gather(*(client.get_positions() for _ in range(3)))
+
+        for _ in range(2):
+            self.assertEqual(asyncio.run(positions()), [[], [], []])
+        client.close()
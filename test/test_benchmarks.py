@@ -0,0 +1,41 @@
+from unittest import TestCase
+from ftx.clients.rest_client import FtxAuth, FtxClient
+from ftx.clients.rate_limit import RateLimiter
+from ftx.data.fetch import _FILLS, _FUNDING, _OPEN_POSITIONS
+from benchmarks.mock_server import MockExchange
+from benchmarks.synthetic import synthetic_fills, synthetic_funding, synthetic_positions
+
+
+class MockExchangeTestCase(TestCase):
+
+    def setUp(self):
+        self.fills = synthetic_fills(1000, 20, days=2)
+        self.markets = sorted(self.fills['market'].unique())
+        self.funding = synthetic_funding(self.markets, days=2)
+        self.positions = synthetic_positions(self.markets)
+        self.exchange = MockExchange(self.fills, self.funding, self.positions, rate_limit_every=7)
+        self.client = FtxClient(FtxAuth(), RateLimiter(rate=1000.0, burst=100))
+        self.client._ROOT = self.exchange.start()
+
+    def tearDown(self):
+        self.exchange.stop()
+
+    def test_synthetic_schemas(self):
+        self.assertEqual(list(self.fills.columns), _FILLS)
+        self.assertEqual(list(self.funding.columns), _FUNDING)
+        self.assertEqual(list(self.positions.columns), _OPEN_POSITIONS)
+
+    def test_paginates_every_record_through_429s(self):
+        fills = self.client.get_all_fills()
+        funding = self.client.get_all_funding_payments()
+
+        self.assertEqual(sorted(f['id'] for f in fills), sorted(self.fills['id']))
+        self.assertEqual(sorted(f['id'] for f in funding), sorted(self.funding['id']))
+        self.assertGreater(self.exchange.requests, 10)
+
+    def test_filters_by_market(self):
+        market = self.markets[0]
+        fills = self.client.get_all_fills(market=market)
+
+        self.assertEqual(len(fills), (self.fills['market'] == market).sum())
+        self.assertEqual(len(self.client.get_positions()), len(self.positions))
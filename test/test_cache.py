@@ -0,0 +1,63 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from ftx.clients.cache import ResponseCache
+from ftx.clients.rest_client import FtxAuth, FtxClient
+from ftx.metrics import Metrics
+
+
+class ResponseCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'responses.sqlite')
+
+    @patch.object(FtxClient, '_request')
+    def test_client_cache(self, mock_client__request):
+        mock_client__request.return_value.status_code = 200
+        mock_client__request.return_value.content = b'{"success": true, "result": [{"name": "BTC-PERP"}]}'
+        metrics = Metrics()
+        client = FtxClient(FtxAuth('key', 'secret'), metrics=metrics, cache=ResponseCache())
+
+        markets = client.list_markets()
+        markets.append({'name': 'changed by caller'})
+        self.assertEqual(client.list_markets(), [{'name': 'BTC-PERP'}])
+        self.assertEqual(mock_client__request.call_count, 1)
+        # Positions are not cached and each subaccount has its own entries
+        client.get_positions()
+        client.get_positions()
+        client.auth = FtxAuth('key', 'secret', 'sub')
+        client.list_markets()
+        self.assertEqual(mock_client__request.call_count, 4)
+
+        client.invalidate_cache('markets')
+        client.list_markets()
+        self.assertEqual(mock_client__request.call_count, 5)
+        self.assertEqual(client.cache.stats(), {'markets': {'hits': 1, 'misses': 3}})
+        self.assertEqual(metrics.to_dict()['cache'], {'markets': {'hits': 1, 'misses': 3}})
+        self.assertIn('ftx_cache_hits_total{endpoint="markets"} 1', metrics.to_prometheus())
+
+    @patch('time.time')
+    def test_ttl_and_lru(self, mock_time):
+        mock_time.return_value = 1000.0
+        cache = ResponseCache({'futures': 10.0}, max_entries=2)
+        for i in range(3):
+            cache.put(ResponseCache.key('key', '', 'futures', {'i': i}), 'futures', i)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(ResponseCache.key('key', '', 'futures', {'i': 0}), 'futures'), (False, None))
+        self.assertEqual(cache.get(ResponseCache.key('key', '', 'futures', {'i': 2}), 'futures'), (True, 2))
+        mock_time.return_value = 1010.0
+        self.assertEqual(cache.get(ResponseCache.key('key', '', 'futures', {'i': 2}), 'futures'), (False, None))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertFalse(cache.cacheable('fills'))
+
+    def test_shared_file(self):
+        key = ResponseCache.key('key', '', 'account', None)
+        writer, reader = ResponseCache(path=self.path), ResponseCache(path=self.path)
+        writer.put(key, 'account', {'collateral': 1.0})
+        self.assertEqual(reader.get(key, 'account'), (True, {'collateral': 1.0}))
+        writer.invalidate()
+        self.assertEqual(ResponseCache(path=self.path).get(key, 'account'), (False, None))
+        self.assertNotIn('key|', open(self.path, 'rb').read().decode(errors='ignore'))
+        writer.close()
+        reader.close()
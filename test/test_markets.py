@@ -0,0 +1,82 @@
+import os
+import tempfile
+from decimal import Decimal
+from unittest import TestCase
+import pandas as pd
+from requests import ConnectionError
+from ftx.data._wranglers import preprocess_fills
+from ftx.data.markets import MarketRegistry, increment_precision
+from test.fixtures import raw_fills
+
+MARKETS = [
+    {'name': 'BTC-PERP', 'type': 'future', 'underlying': 'BTC', 'baseCurrency': None, 'quoteCurrency': None, 'sizeIncrement': 0.0001, 'priceIncrement': 1.0},
+    {'name': 'NEW-PERP', 'type': 'future', 'underlying': 'NEW', 'baseCurrency': None, 'quoteCurrency': None, 'sizeIncrement': 0.01, 'priceIncrement': 2.5e-05},
+    {'name': 'NEW/USD', 'type': 'spot', 'underlying': None, 'baseCurrency': 'NEW', 'quoteCurrency': 'USD', 'sizeIncrement': 1.0, 'priceIncrement': 0.001},
+]
+FUTURES = [
+    {'name': 'BTC-PERP', 'underlying': 'BTC', 'type': 'perpetual', 'sizeIncrement': 0.0001, 'priceIncrement': 1.0},
+    {'name': 'NEW-PERP', 'underlying': 'NEW', 'type': 'perpetual', 'sizeIncrement': 0.01, 'priceIncrement': 2.5e-05},
+]
+
+
+class StubClient(object):
+
+    def __init__(self, offline: bool = False) -> None:
+        self.offline = offline
+        self.calls = 0
+
+    def list_markets(self):
+        self.calls += 1
+        if self.offline:
+            raise ConnectionError('offline')
+        return MARKETS
+
+    def list_futures(self):
+        return FUTURES
+
+
+class MarketRegistryTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = os.path.join(tempfile.mkdtemp(), 'markets.json')
+
+    def test_increment_precision(self):
+        self.assertEqual([increment_precision(x) for x in (0.0001, 1.0, 25.0, 0.5, 2.5e-05)], [4, 0, 0, 1, 6])
+
+    def test_precisions(self):
+        registry = MarketRegistry.load(StubClient())
+        markets = pd.Series(['NEW-PERP', 'BTC-PERP', 'NEW-0626', 'ETH-PERP', 'NEW-PERP'], index=[5, 4, 3, 2, 1])
+        # NEW-0626 is not listed and takes the precision of NEW futures, ETH is only in the static table
+        pd.testing.assert_series_equal(registry.size_precision(markets), pd.Series([2, 4, 2, 3, 2], index=markets.index))
+        pd.testing.assert_series_equal(registry.price_precision(markets), pd.Series([6, 0, 6, 2, 6], index=markets.index))
+        self.assertEqual(registry.info('NEW-PERP')['type'], 'perpetual')
+        self.assertEqual(registry.info('NEW/USD')['baseCurrency'], 'NEW')
+        with self.assertRaisesRegex(KeyError, 'OTHER'):
+            registry.size_precision(pd.Series(['BTC-PERP', 'OTHER-PERP']))
+
+    def test_cache(self):
+        client = StubClient()
+        self.assertEqual(len(MarketRegistry.load(client, self.cache)), 3)
+        self.assertEqual(len(MarketRegistry.load(client, self.cache)), 3)
+        self.assertEqual(client.calls, 1)
+        # Expired cache is refreshed
+        MarketRegistry.load(client, self.cache, ttl=0)
+        self.assertEqual(client.calls, 2)
+
+    def test_offline_fallback(self):
+        MarketRegistry.load(StubClient(), self.cache)
+        # Stale cache is used when the API can not be reached, then the static table
+        self.assertIn('NEW-PERP', MarketRegistry.load(StubClient(offline=True), self.cache, ttl=0))
+        static = MarketRegistry.load(StubClient(offline=True))
+        self.assertEqual(len(static), 0)
+        self.assertEqual(list(static.size_precision(pd.Series(['BTC-PERP', 'ETH-0626']))), [4, 3])
+
+    def test_preprocess_fills_with_registry(self):
+        fills = raw_fills({'NEW-PERP': [1.234, -1.234], 'BTC-PERP': [0.12345]})
+        with self.assertRaisesRegex(KeyError, 'NEW'):
+            preprocess_fills(fills)
+        registry = MarketRegistry.load(StubClient())
+        _, _, futures_by_market, _ = preprocess_fills(fills, registry=registry)
+        self.assertEqual(list(futures_by_market['NEW-PERP']['size']), [Decimal('1.23'), Decimal('1.23')])
+        _, _, futures_by_market, _ = preprocess_fills(fills, fixed_point=True, registry=registry)
+        self.assertEqual(list(futures_by_market['NEW-PERP']['size_scale']), [100, 100])
@@ -0,0 +1,77 @@
+import json
+from unittest import TestCase
+import pandas as pd
+import ftx.metrics
+from ftx.metrics import Metrics
+from ftx.clients.rest_client import FtxAuth, FtxClient
+from ftx.clients.rate_limit import RateLimiter
+from ftx.data._wranglers import add_trades, preprocess_fills
+from ftx.data.process import get_futures_trades_by_market
+from benchmarks.mock_server import MockExchange
+from benchmarks.synthetic import synthetic_fills, synthetic_funding, synthetic_positions
+from test.fixtures import raw_fills
+
+
+class MetricsTestCase(TestCase):
+
+    def tearDown(self):
+        ftx.metrics.disable()
+
+    def test_client_records_requests_pages_and_retries(self):
+        fills = synthetic_fills(500, 10, days=1)
+        markets = sorted(fills['market'].unique())
+        exchange = MockExchange(fills, synthetic_funding(markets, days=1), synthetic_positions(markets), rate_limit_every=4)
+        metrics = Metrics()
+        client = FtxClient(FtxAuth(), RateLimiter(rate=1000.0, burst=100), metrics)
+        client._ROOT = exchange.start()
+        try:
+            self.assertEqual(len(client.get_all_fills()), 500)
+        finally:
+            exchange.stop()
+
+        requests = metrics.to_dict()['requests']['fills']
+        pagination = metrics.to_dict()['pagination']['fills']
+        self.assertEqual(requests['count'], exchange.requests)
+        self.assertEqual(requests['bytes'], exchange.bytes_sent + requests['status']['429'] * len(b'{"success": false, "error": "Do not send more than 30 requests per second"}'))
+        self.assertEqual(requests['retries'], requests['status']['429'])
+        self.assertEqual(sum(requests['buckets'].values()), requests['count'])
+        self.assertEqual(pagination['paginations'], 1)
+        self.assertEqual(pagination['pages'], requests['status']['200'])
+        # Every full page is followed by one repeating its oldest fill
+        self.assertGreaterEqual(pagination['duplicates'], pagination['pages'] - 1)
+        # Request and pagination series share the endpoint label
+        self.assertIn('ftx_pages_total{endpoint="fills"}', metrics.to_prometheus())
+
+    def test_stages_only_recorded_while_enabled(self):
+        _, _, two_markets, _ = preprocess_fills(raw_fills({'BTC-PERP': [1, -1], 'ETH-PERP': [1, 1, -2]}))
+        metrics = ftx.metrics.enable()
+        _, _, futures_by_market, _ = preprocess_fills(raw_fills({'BTC-PERP': [1, -2, 1]}))
+        add_trades(futures_by_market['BTC-PERP'])
+        # Trades of each market are timed when they are computed, with the fills of that market as rows
+        trades = get_futures_trades_by_market(two_markets, pd.DataFrame(columns=['future', 'time', 'payment']))
+        self.assertNotIn('get_futures_trades_by_market', metrics.to_dict()['stages'])
+        dict(trades)
+        ftx.metrics.disable()
+        preprocess_fills(raw_fills({'BTC-PERP': [1, -1]}))
+
+        stages = metrics.to_dict()['stages']
+        self.assertEqual(stages['preprocess_fills'], {'calls': 1, 'seconds': stages['preprocess_fills']['seconds'], 'rows': 3})
+        self.assertEqual(stages['convert_futures_size']['calls'], 1)
+        # add_trades also ran for each market of the trades
+        self.assertEqual(stages['add_trades']['rows'], 3 + 5)
+        self.assertEqual((stages['get_futures_trades_by_market']['calls'], stages['get_futures_trades_by_market']['rows']), (2, 5))
+
+    def test_exporters(self):
+        metrics = Metrics()
+        metrics.observe_request('fills', 200, 0.03, 100)
+        metrics.observe_request('fills', 429, 20.0, 10)
+        metrics.observe_stage('add_trades', 0.5, 7)
+
+        text = metrics.to_prometheus()
+        self.assertIn('ftx_request_duration_seconds_bucket{endpoint="fills",le="0.025"} 0', text)
+        self.assertIn('ftx_request_duration_seconds_bucket{endpoint="fills",le="0.05"} 1', text)
+        self.assertIn('ftx_request_duration_seconds_bucket{endpoint="fills",le="+Inf"} 2', text)
+        self.assertIn('ftx_responses_total{endpoint="fills",status="429"} 1', text)
+        self.assertIn('ftx_response_bytes_total{endpoint="fills"} 110', text)
+        self.assertIn('ftx_stage_rows_total{stage="add_trades"} 7', text)
+        self.assertEqual(json.loads(metrics.to_json())['stages']['add_trades']['calls'], 1)
@@ -0,0 +1,113 @@
+from unittest import TestCase
+from unittest.mock import patch
+import pandas as pd
+from ftx.data._wranglers import add_trades, preprocess_fills, preprocess_funding
+from ftx.data.process import get_futures_summary, get_spot_summary, attribute_funding, get_futures_trades_by_market, _balanced_chunks
+from test.fixtures import raw_fills, raw_funding
+
+
+class SummaryTestCase(TestCase):
+
+    def setUp(self):
+        self.futures_fills = pd.DataFrame({
+            'market': ['BTC-PERP', 'ETH-PERP', 'BTC-PERP', 'ETH-PERP', 'BTC-PERP'],
+            'side': ['buy', 'buy', 'sell', 'sell', 'buy'],
+            'liquidity': ['taker', 'maker', 'maker', 'taker', 'taker'],
+            'volume': [100.0, 50.0, 120.0, 40.0, 30.0],
+            'fee': [0.07, 0.01, 0.02, 0.028, 0.021],
+        })
+        self.funding = pd.DataFrame({'future': ['BTC-PERP', 'BTC-PERP', 'SOL-PERP'], 'payment': [0.5, -0.2, 1.0]})
+        self.open_positions = pd.DataFrame({'future': ['BTC-PERP'], 'cost': [30.0]})
+        self.spot_fills = pd.DataFrame({
+            'market': ['ETH/BTC', 'FTT/USD', 'ETH/BTC'],
+            'side': ['buy', 'sell', 'sell'],
+            'liquidity': ['taker', 'taker', 'maker'],
+            'volume': [0.5, 10.0, 0.25],
+            'fee': [0.001, 0.007, 0.0001],
+            'feeCurrency': ['ETH', 'USD', 'BTC'],
+            'price': [0.03, 2.0, 0.03],
+        })
+
+    def test_get_futures_summary(self):
+        summary = get_futures_summary(self.futures_fills, self.funding, self.open_positions)
+        self.assertEqual(list(summary.index), ['BTC-PERP', 'ETH-PERP', 'TOTAL'])
+        self.assertEqual(list(summary.columns), ['Volume', 'TakerVolume', 'MakerVolume', 'SellVolume', 'BuyVolume', 'Fees', 'Funding', 'RawPNL', 'RPNL'])
+        btc = summary.loc['BTC-PERP']
+        self.assertEqual(list(btc[['Volume', 'TakerVolume', 'MakerVolume', 'SellVolume', 'BuyVolume']]), [250.0, 130.0, 120.0, 120.0, 100.0])
+        self.assertAlmostEqual(btc['Fees'], 0.111)
+        self.assertAlmostEqual(btc['Funding'], 0.3)
+        self.assertAlmostEqual(btc['RPNL'], 20.0 - 0.111 - 0.3)
+        eth = summary.loc['ETH-PERP']
+        self.assertEqual(list(eth[['Volume', 'TakerVolume', 'MakerVolume', 'SellVolume', 'BuyVolume', 'Funding']]), [90.0, 40.0, 50.0, 40.0, 50.0, 0.0])
+        pd.testing.assert_series_equal(summary.loc['TOTAL'][:7], summary.iloc[:2, :7].sum(), check_names=False)
+
+    def test_get_futures_summary_empty(self):
+        fills = pd.DataFrame(columns=['market', 'side', 'liquidity', 'volume', 'fee'])
+        summary = get_futures_summary(fills, self.funding, self.open_positions)
+        self.assertEqual(list(summary.index), ['TOTAL'])
+        self.assertEqual(summary.loc['TOTAL', 'Volume'], 0)
+
+    def test_get_spot_summary(self):
+        summary = get_spot_summary(self.spot_fills)
+        self.assertEqual(list(summary.index), ['ETH/BTC', 'FTT/USD'])
+        self.assertEqual(list(summary['FeeCurrency']), ['BTC', 'USD'])
+        self.assertEqual(list(summary.loc['ETH/BTC', ['Volume', 'TakerVolume', 'MakerVolume', 'SellVolume', 'BuyVolume']]), [0.75, 0.5, 0.25, 0.25, 0.5])
+        # ETH fee converted to BTC with the fill price
+        self.assertAlmostEqual(summary.loc['ETH/BTC', 'Fees'], 0.0001)
+        self.assertAlmostEqual(summary.loc['FTT/USD', 'Fees'], 0.007)
+
+
+class AttributeFundingTestCase(TestCase):
+
+    def test_attribute_funding(self):
+        times = pd.to_datetime(['2020-01-01T01:00:00+00:00', '2020-01-01T02:00:00+00:00', '2020-01-01T03:00:00+00:00', '2020-01-01T05:00:00+00:00'])
+        funding = pd.DataFrame({'time': times[::-1], 'payment': [8.0, 4.0, 2.0, 1.0]})
+        trades = pd.DataFrame({
+            'start': pd.to_datetime(['2020-01-01T00:00:00+00:00', '2020-01-01T02:00:00+00:00', '2020-01-01T03:30:00+00:00', '2020-01-01T06:00:00+00:00']),
+            'end': pd.to_datetime(['2020-01-01T01:30:00+00:00', '2020-01-01T03:00:00+00:00', '2020-01-01T04:00:00+00:00', '2020-01-01T07:00:00+00:00']),
+        }, index=[3, 4, 5, 6])
+        expected = pd.Series([1.0, 6.0, 0.0, 0.0], index=[3, 4, 5, 6], name='funding')
+        # Same result as slicing the funding series for every trade
+        f = funding.set_index('time').sort_index()['payment']
+        pd.testing.assert_series_equal(trades.apply(lambda x: f[x.start:x.end].sum(), axis=1).rename('funding'), expected)
+        pd.testing.assert_series_equal(attribute_funding(trades, funding), expected)
+
+    def test_attribute_funding_empty(self):
+        trades = pd.DataFrame({'start': pd.to_datetime(['2020-01-01T00:00:00+00:00']), 'end': pd.to_datetime(['2020-01-01T01:00:00+00:00'])})
+        funding = pd.DataFrame({'time': pd.to_datetime([], utc=True), 'payment': []})
+        self.assertEqual(list(attribute_funding(trades, funding)), [0.0])
+
+
+class TradesByMarketTestCase(TestCase):
+
+    @patch('ftx.data.process.add_trades', wraps=add_trades)
+    def test_trades_computed_on_access(self, mock_add_trades):
+        _, _, futures_by_market, _ = preprocess_fills(raw_fills())
+        trades = get_futures_trades_by_market(futures_by_market, preprocess_funding(raw_funding()))
+        self.assertEqual(list(trades), list(futures_by_market))
+        self.assertEqual(mock_add_trades.call_count, 0)
+
+        btc = trades['BTC-PERP']
+        self.assertIs(trades['BTC-PERP'], btc)
+        self.assertEqual(mock_add_trades.call_count, 1)
+        # Open last trade is dropped
+        self.assertEqual(list(btc.index), [0, 1, 2])
+        with self.assertRaises(KeyError):
+            trades['SOL-PERP']
+
+    def test_trades_on_process_pool(self):
+        fills = raw_fills({'BTC-PERP': [0.5, -0.2, -0.5, 0.2, 0.1, -0.1, 0.3], 'ETH-PERP': [0.1, -0.1, 0.2], 'SOL-PERP': [1, 2, -3]})
+        funding = preprocess_funding(raw_funding())
+        for fixed_point in (False, True):
+            _, _, futures_by_market, _ = preprocess_fills(fills, fixed_point)
+            serial = get_futures_trades_by_market(futures_by_market, funding)
+            parallel = get_futures_trades_by_market(futures_by_market, funding, workers=2)
+            self.assertIsInstance(parallel, dict)
+            self.assertEqual(list(parallel), list(serial))
+            for market, trades in serial.items():
+                pd.testing.assert_frame_equal(parallel[market], trades)
+
+    def test_balanced_chunks(self):
+        chunks = _balanced_chunks({'A': 10, 'B': 7, 'C': 5, 'D': 4, 'E': 1}, 2)
+        self.assertEqual(chunks, [['A', 'D'], ['B', 'C', 'E']])
+        self.assertEqual(_balanced_chunks({'A': 10}, 4), [['A']])
@@ -0,0 +1,28 @@
+import time
+from unittest import TestCase
+from ftx.clients.rate_limit import RateLimiter
+
+
+class RateLimiterTestCase(TestCase):
+
+    def test_rate_limiter_acquire_burst(self):
+        limiter = RateLimiter(rate=10, burst=3)
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
+        # Bucket is empty, next token is 1 / rate away
+        self.assertGreater(limiter.acquire(), 0.05)
+
+    def test_rate_limiter_backoff(self):
+        limiter = RateLimiter(rate=30, min_rate=10)
+        limiter.backoff()
+        self.assertEqual(limiter.rate, 15)
+        limiter.backoff()
+        self.assertEqual(limiter.rate, 10)
+        limiter.success()
+        self.assertGreater(limiter.rate, 10)
+
+    def test_rate_limiter_for_key(self):
+        self.assertIs(RateLimiter.for_key('shared-key'), RateLimiter.for_key('shared-key'))
+        self.assertIsNot(RateLimiter.for_key('shared-key'), RateLimiter.for_key('other-key'))
@@ -1,9 +1,11 @@
 import time
+from datetime import datetime, timezone
 from urllib import parse
 from unittest import TestCase
 from unittest.mock import patch
 from requests import Request, Session, Response, HTTPError
-from ftx.clients.rest_client import FtxAuth, FtxClient, AuthError, ApiError
+from ftx.clients.rest_client import FtxAuth, FtxClient, AuthError, ApiError, RateLimitError
+from ftx.clients.rate_limit import RateLimiter
 
 
 class FtxAuthTestCase(TestCase):
@@ -55,6 +57,36 @@ class FtxClientTestCase(TestCase):
         client = FtxClient()
         self.assertEqual(client._request('GET', '/', params={}).status_code, 200)
 
+    # Requests built by the client are the same as prepared and signed requests
+    @patch('time.time')
+    @patch.object(Session, 'send')
+    def test_client__request_signed(self, mock_session, mocked_timestamp):
+        mocked_timestamp.return_value = 1607195350.5327864
+        auth = FtxAuth('api-key', 'api-secret', 'test subaccount')
+        client = FtxClient(auth)
+        params = {'market': 'BTC-PERP', 'limit': 100, 'start_time': 1577836800.5, 'end_time': None, 'showAvgPrice': False}
+        client._request('GET', 'fills', params)
+        sent = mock_session.call_args[0][0]
+        expected = auth.sign_http_request(Request('GET', f'{client._ROOT}fills', params=params))
+        self.assertEqual(sent.url, expected.url)
+        self.assertEqual(sent.path_url, expected.path_url)
+        self.assertEqual(dict(sent.headers), {k: v for k, v in expected.headers.items() if k.startswith('FTX-')})
+
+    # Requests are signed after waiting on the rate limiter
+    @patch('time.time')
+    @patch.object(Session, 'send')
+    def test_client__request_signed_after_wait(self, mock_session, mocked_timestamp):
+        mocked_timestamp.return_value = 1600000000.0
+        limiter = RateLimiter()
+
+        def acquire():
+            mocked_timestamp.return_value += 30.0
+            return 30.0
+
+        limiter.acquire = acquire
+        FtxClient(FtxAuth('api-key', 'api-secret'), limiter)._request('GET', 'fills', {})
+        self.assertEqual(mock_session.call_args[0][0].headers['FTX-TS'], '1600000030000')
+
     # Test exception raising from response with bad code
     def test_client__response_HTTPError(self):
         response = Response()
@@ -63,34 +95,100 @@ class FtxClientTestCase(TestCase):
         self.assertRaises(HTTPError, client._response, response=response)
 
     # Test exception raising from authentication error
-    @patch.object(Response, 'json')
-    def test_client__response_AuthError(self, mock_response_json):
-        mock_response_json.return_value = {'success': None, 'error': 'Not logged in'}
+    def test_client__response_AuthError(self):
         response = Response()
         response.status_code = 400
+        response._content = b'{"success": false, "error": "Not logged in"}'
         client = FtxClient()
         self.assertRaises(AuthError, client._response, response=response)
 
     # Test exception raising from api error
-    @patch.object(Response, 'json')
-    def test_client__response_ApiError(self, mock_response_json):
-        mock_response_json.return_value = {'success': None, 'error': 'Anything else'}
+    def test_client__response_ApiError(self):
         client = FtxClient()
         response = Response()
         response.status_code = 400
+        response._content = b'{"success": false, "error": "Anything else"}'
         self.assertRaises(ApiError, client._response, response=response)
 
-    @patch.object(Response, 'json')
-    def test_client__response(self, mock_response_json):
-        mock_response_json.return_value = {'success': True, 'result': 'data'}
+    def test_client__response(self):
         response = Response()
         response.status_code = 200
+        response._content = b'{"success": true, "result": "data"}'
         client = FtxClient()
         self.assertEqual(client._response(response), 'data')
 
     # FtxClient._get() is only a wrapper
     @patch.object(FtxClient, '_request')
     def test_client__get(self, mock_client__request):
-        mock_client__request.return_value.json = lambda : {'success': True, 'result': 'data'}
+        mock_client__request.return_value.content = b'{"success": true, "result": "data"}'
         client = FtxClient()
         self.assertEqual(client._get('/'), 'data')
+
+    # Test 429 raises a rate limit error and slows the limiter down
+    def test_client__response_RateLimitError(self):
+        response = Response()
+        response.status_code = 429
+        limiter = RateLimiter()
+        client = FtxClient(rate_limiter=limiter)
+        self.assertRaises(RateLimitError, client._response, response=response)
+        self.assertLess(limiter.rate, 30)
+
+    # Rate limited requests are retried
+    @patch.object(FtxClient, '_request')
+    @patch.object(FtxClient, '_response')
+    def test_client__get_RateLimitError(self, mock_client__response, mock_client__request):
+        mock_client__response.side_effect = [RateLimitError('Rate limit'), 'data']
+        client = FtxClient()
+        self.assertEqual(client._get('/'), 'data')
+        self.assertEqual(mock_client__request.call_count, 2)
+
+    # Sharded pagination returns the same fills as sequential pagination, including fills on window boundaries
+    # and fills between the last whole second and a fractional end_time
+    @patch.object(FtxClient, 'get_fills')
+    def test_client_get_all_fills_sharded(self, mock_client_get_fills):
+        start = 1600000000
+        fills = [{'id': i, 'time': datetime.fromtimestamp(start + i // 3 + 0.5, timezone.utc).isoformat()} for i in range(900)]
+
+        def get_fills(market=None, start_time=None, end_time=None, limit=None):
+            window = [f for f in fills if (start_time or 0) <= datetime.fromisoformat(f['time']).timestamp() <= (end_time or 2e9)]
+            return sorted(window, key=lambda f: f['id'], reverse=True)[:limit]
+
+        mock_client_get_fills.side_effect = get_fills
+        client = FtxClient()
+        sequential = client.get_all_fills(start_time=start + 0.25, end_time=start + 299.75)
+        sharded = client.get_all_fills(start_time=start + 0.25, end_time=start + 299.75, shards=4)
+        self.assertEqual(len(sharded), 900)
+        self.assertEqual([f['id'] for f in sharded], [f['id'] for f in sequential])
+        self.assertRaises(ValueError, client.get_all_fills, shards=4)
+
+    # Pages are streamed and records repeated on the boundary timestamp are dropped
+    @patch.object(FtxClient, 'get_fills')
+    def test_client_iter_fills(self, mock_client_get_fills):
+        first_page = [{'id': i, 'time': f'2020-01-01T00:00:{59 - i % 50:02d}+00:00'} for i in range(100)]
+        second_page = [{'id': 99, 'time': '2020-01-01T00:00:10+00:00'}, {'id': 100, 'time': '2020-01-01T00:00:05+00:00'}]
+        mock_client_get_fills.side_effect = [first_page, second_page]
+        client = FtxClient()
+        pages = list(client.iter_fills())
+        self.assertEqual([[f['id'] for f in page] for page in pages], [list(range(100)), [100]])
+        self.assertEqual(mock_client_get_fills.call_args.kwargs['end_time'], datetime.fromisoformat('2020-01-01T00:00:10+00:00').timestamp())
+
+    # More fills share one timestamp than fit in a page, the page is widened until pagination moves past it
+    @patch.object(FtxClient, 'get_fills')
+    def test_client_get_all_fills_same_timestamp(self, mock_client_get_fills):
+        fills = [{'id': i, 'time': '2020-01-01T00:00:50.250000+00:00' if 50 <= i < 300 else f'2020-01-01T00:00:{i % 60:02d}.{i:06d}+00:00'} for i in range(700)]
+        fills.sort(key=lambda f: (datetime.fromisoformat(f['time']), f['id']), reverse=True)
+
+        def get_fills(market=None, start_time=None, end_time=None, limit=None):
+            return [f for f in fills if end_time is None or datetime.fromisoformat(f['time']).timestamp() <= end_time][:limit]
+
+        mock_client_get_fills.side_effect = get_fills
+        self.assertEqual(sorted(f['id'] for f in FtxClient().get_all_fills()), list(range(700)))
+        # Pages are only widened while they sit on the crowded timestamp, then back to the default limit
+        limits = [c.kwargs['limit'] for c in mock_client_get_fills.call_args_list]
+        self.assertEqual(limits, [100, 100, 200, 400, 100, 100, 100])
+
+    @patch.object(FtxClient, 'get_funding_payments')
+    def test_client_get_all_funding_payments_same_timestamp(self, mock_client_get_funding_payments):
+        mock_client_get_funding_payments.return_value = [{'id': i, 'time': '2020-01-01T00:00:00+00:00'} for i in range(100)]
+        self.assertRaises(ApiError, FtxClient().get_all_funding_payments)
+
@@ -0,0 +1,67 @@
+import json
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from ftx.clients.rest_client import FtxAuth, FtxClient
+from ftx.data.store import HistoryStore
+
+
+def fill(id, second):
+    return {'id': id, 'market': 'BTC-PERP', 'time': f'2020-01-01T00:00:{second:02d}+00:00'}
+
+
+class HistoryStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.store = HistoryStore(':memory:')
+        self.client = FtxClient(FtxAuth(subaccount='sub'))
+
+    def tearDown(self):
+        self.store.close()
+
+    @patch.object(FtxClient, 'get_all_fills')
+    def test_store_sync_fills_from_watermark(self, mock_client_get_all_fills):
+        mock_client_get_all_fills.return_value = [fill(2, 10), fill(1, 5)]
+        self.assertEqual(self.store.sync_fills(self.client), 2)
+        mock_client_get_all_fills.assert_called_with(start_time=None)
+
+        # Watermark second is fetched again, the known fill is ignored
+        mock_client_get_all_fills.return_value = [fill(3, 20), fill(2, 10)]
+        self.assertEqual(self.store.sync_fills(self.client), 1)
+        mock_client_get_all_fills.assert_called_with(start_time=1577836810.0)
+        key = self.client.auth.key_id
+        self.assertEqual(self.store.watermark('fills', 'sub', key), 1577836820.0)
+
+        self.assertEqual([f['id'] for f in self.store.records('fills', 'sub', key=key)], [3, 2, 1])
+        self.assertEqual(self.store.records('fills', key=key), [])
+
+    # Main accounts of two API keys share one file without sharing records or watermarks
+    @patch.object(FtxClient, 'get_all_fills')
+    def test_store_sync_fills_per_key(self, mock_client_get_all_fills):
+        first, second = FtxClient(FtxAuth('first-key')), FtxClient(FtxAuth('second-key'))
+        mock_client_get_all_fills.return_value = [fill(2, 10), fill(1, 5)]
+        self.assertEqual(self.store.sync_fills(first), 2)
+        mock_client_get_all_fills.return_value = [fill(1, 30)]
+        self.assertEqual(self.store.sync_fills(second), 1)
+        mock_client_get_all_fills.assert_called_with(start_time=None)
+
+        self.assertEqual([f['id'] for f in self.store.records('fills', key=first.auth.key_id)], [2, 1])
+        self.assertEqual(self.store.records('fills', key=second.auth.key_id), [fill(1, 30)])
+        self.assertEqual(self.store.watermark('fills', key=first.auth.key_id), 1577836810.0)
+
+    # Files written before records were keyed by API key are migrated with their rows under the empty key
+    def test_store_unkeyed_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.db')
+            conn = sqlite3.connect(path)
+            with conn:
+                conn.execute('CREATE TABLE fills (account TEXT NOT NULL, id INTEGER NOT NULL, time REAL NOT NULL, record TEXT NOT NULL, PRIMARY KEY (account, id))')
+                conn.execute('INSERT INTO fills VALUES (?, ?, ?, ?)', ('sub', 1, 1577836805.0, json.dumps(fill(1, 5))))
+            conn.close()
+
+            store = HistoryStore(path)
+            self.assertEqual(store.records('fills', 'sub'), [fill(1, 5)])
+            self.assertEqual(store.insert('fills', [fill(1, 5)], 'sub', self.client.auth.key_id), 1)
+            store.close()
@@ -0,0 +1,139 @@
+import asyncio
+import itertools
+import time
+from unittest import TestCase
+from unittest.mock import patch
+import pandas as pd
+from requests import ConnectionError, HTTPError, Response, Session
+from ftx.clients.async_client import AsyncFtxClient
+from ftx.clients.rate_limit import RateLimiter
+from ftx.clients.rest_client import FtxAuth, FtxClient, PaginationInterrupted
+from ftx.clients.transport import Transport
+from ftx.metrics import Metrics
+from benchmarks.mock_server import MockExchange
+from benchmarks.synthetic import synthetic_fills, synthetic_funding, synthetic_positions
+
+
+class TransportTestCase(TestCase):
+
+    def setUp(self):
+        self.fills = synthetic_fills(1000, 10, days=2)
+        self.markets = sorted(self.fills['market'].unique())
+
+    def start(self, transport: Transport, metrics: Metrics = None, **faults) -> FtxClient:
+        self.exchange = MockExchange(self.fills, synthetic_funding(self.markets, days=2), synthetic_positions(self.markets), **faults)
+        self.addCleanup(self.exchange.stop)
+        client = FtxClient(FtxAuth(), RateLimiter(rate=1000.0, burst=100), metrics, transport=transport)
+        client._ROOT = self.exchange.start()
+        return client
+
+    def assert_all_fills(self, fills):
+        self.assertEqual(sorted(f['id'] for f in fills), sorted(self.fills['id']))
+
+    def test_retries_server_errors(self):
+        metrics = Metrics()
+        client = self.start(Transport(backoff=0.001), metrics, error_every=3)
+        self.assert_all_fills(client.get_all_fills())
+        requests = metrics.to_dict()['requests']['fills']
+        self.assertEqual(requests['retries'], requests['status']['502'])
+
+    # 5xx responses carrying a JSON error are retried like any other server error
+    def test_retries_server_errors_with_json_body(self):
+        metrics = Metrics()
+        client = self.start(Transport(backoff=0.001), metrics, unavailable_every=3)
+        self.assert_all_fills(client.get_all_fills())
+        requests = metrics.to_dict()['requests']['fills']
+        self.assertEqual(requests['retries'], requests['status']['503'])
+
+    def test_retries_timeouts(self):
+        client = self.start(Transport(read_timeout=0.1, backoff=0.001), stall_every=4, stall=0.5)
+        self.assert_all_fills(client.get_all_fills())
+
+    def test_hedged_requests(self):
+        client = self.start(Transport(hedge_after=0.05), stall_every=3, stall=0.5)
+        start = time.monotonic()
+        self.assert_all_fills(client.get_all_fills())
+        # Four of the eleven pages stall, each one is answered by its duplicate
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_resume_pagination(self):
+        client = self.start(Transport(retries=0), error_every=4)
+        try:
+            fills = client.get_all_fills()
+            self.fail('Pagination was not interrupted')
+        except PaginationInterrupted as e:
+            interrupted = e
+        while True:
+            try:
+                fills = interrupted.resume()
+                break
+            except PaginationInterrupted as e:
+                self.assertIs(e.results, interrupted.results)
+                interrupted = e
+        self.assert_all_fills(fills)
+        self.assertIs(fills, interrupted.results)
+
+    # Windows finished before the interruption are kept, resume() only finishes the interrupted ones
+    def test_resume_sharded_pagination(self):
+        client = self.start(Transport(retries=0), error_every=4)
+        times = pd.to_datetime(self.fills['time'])
+        start, end = times.min().timestamp(), times.max().timestamp()
+        try:
+            fills = client.get_all_fills(start_time=start, end_time=end, shards=4)
+            self.fail('Pagination was not interrupted')
+        except PaginationInterrupted as e:
+            interrupted = e
+        while True:
+            before = len(interrupted.results)
+            try:
+                fills = interrupted.resume()
+                break
+            except PaginationInterrupted as e:
+                self.assertGreaterEqual(len(e.results), before)
+                interrupted = e
+        self.assert_all_fills(fills)
+        self.assertEqual(len(fills), len(self.fills))
+
+    def test_async_resume_pagination(self):
+        self.start(Transport(retries=0), error_every=5)
+
+        async def fetch():
+            async with AsyncFtxClient(rate_limiter=RateLimiter(rate=1000.0, burst=100), transport=Transport(retries=0)) as client:
+                client._client._ROOT = self.exchange.url
+                try:
+                    return await client.get_all_fills()
+                except PaginationInterrupted as e:
+                    interrupted = e
+                while True:
+                    try:
+                        return await interrupted.resume()
+                    except PaginationInterrupted as e:
+                        interrupted = e
+
+        self.assert_all_fills(asyncio.run(fetch()))
+
+    # Every attempt is signed again with the current time
+    @patch('time.time')
+    @patch.object(Session, 'send')
+    def test_retries_are_signed_again(self, mock_session_send, mock_time):
+        mock_time.side_effect = itertools.count(1600000000.0)
+        response = Response()
+        response.status_code = 200
+        response._content = b'{"success": true, "result": []}'
+        mock_session_send.side_effect = [ConnectionError('reset'), response]
+        client = FtxClient(FtxAuth('key', 'secret'), RateLimiter(rate=1000.0, burst=100), transport=Transport(connect_timeout=1.0, read_timeout=2.0, backoff=0))
+        self.assertEqual(client.get_positions(), [])
+        sent = [int(c.args[0].headers['FTX-TS']) for c in mock_session_send.call_args_list]
+        self.assertEqual(len(sent), 2)
+        self.assertLess(sent[0], sent[1])
+        self.assertEqual(mock_session_send.call_args.kwargs['timeout'], (1.0, 2.0))
+
+    # Client errors are final, bodies that are not JSON are retried
+    def test_retryable(self):
+        response = Response()
+        response.status_code = 404
+        self.assertFalse(Transport.retryable(HTTPError(response=response)))
+        response.status_code = 200
+        self.assertTrue(Transport.retryable(HTTPError(response=response)))
+        self.assertTrue(Transport.retryable(ConnectionError()))
+        self.assertTrue(0 <= Transport(backoff=1.0, max_backoff=3.0).delay(5) <= 3.0)
@@ -0,0 +1,111 @@
+from decimal import Decimal
+from unittest import TestCase
+import pandas as pd
+import numpy as np
+from ftx.data._wranglers import FILLS_SCHEMA, MarketFrames, preprocess_fills, add_trades, convert_futures_size
+from test.fixtures import raw_fills
+
+
+class FixedPointTestCase(TestCase):
+
+    def test_preprocess_fills_fixed_point(self):
+        _, futures, futures_by_market, _ = preprocess_fills(raw_fills(), fixed_point=True)
+        self.assertEqual(futures['size'].dtype, 'int64')
+        btc = futures_by_market['BTC-PERP']
+        self.assertEqual(list(btc['size']), [5000, 2000, 5000, 2000, 1000, 1000, 3000])
+        self.assertEqual(list(btc['size_scale'].unique()), [10000])
+        self.assertEqual(list(futures_by_market['ETH-PERP']['size']), [1000, 1000, 2000])
+
+    def test_add_trades_fixed_point(self):
+        _, _, futures_by_market, _ = preprocess_fills(raw_fills(), fixed_point=True)
+        fills = add_trades(futures_by_market['BTC-PERP'])
+        self.assertEqual(list(fills['delta']), [5000, 3000, 0, -2000, 0, 1000, 0, 3000])
+        self.assertEqual(list(fills['trade_nr']), [0, 0, 0, 1, 1, 2, 2, 3])
+        self.assertEqual(list(fills['split_fill'].fillna('')), ['', '', 'first', 'second', '', '', '', ''])
+        # Split fill volume uses the unscaled size
+        self.assertEqual(list(fills['volume'].round(6)), [50.0, 20.2, 30.6, 20.4, 20.6, 10.4, 10.5, 31.8])
+
+
+class AddTradesTestCase(TestCase):
+
+    def test_add_trades(self):
+        _, _, futures_by_market, _ = preprocess_fills(raw_fills())
+        btc = futures_by_market['BTC-PERP']
+        fills = add_trades(btc)
+        self.assertEqual(list(fills['size']), [Decimal(x) for x in ['0.5', '-0.2', '-0.3', '-0.2', '0.2', '0.1', '-0.1', '0.3']])
+        self.assertEqual(list(fills['delta']), [Decimal(x) for x in ['0.5', '0.3', '0', '-0.2', '0', '0.1', '0', '0.3']])
+        self.assertEqual(list(fills['trade_nr']), [0, 0, 0, 1, 1, 2, 2, 3])
+        # Both parts of the split fill keep the integer ids, split_fill tells them apart
+        self.assertEqual(list(fills['id'][2:4]), [1002, 1002])
+        self.assertEqual(list(fills['split_fill'][2:4]), ['first', 'second'])
+        self.assertAlmostEqual(fills['fee'].iloc[3], 20.4 * 0.0007)
+        # Input frame is left untouched
+        self.assertNotIn('delta', btc)
+        self.assertEqual(btc['size'].iloc[1], Decimal('0.2'))
+
+    def test_add_trades_string_ids(self):
+        _, _, futures_by_market, _ = preprocess_fills(raw_fills())
+        btc = futures_by_market['BTC-PERP'].astype({'id': 'str', 'orderId': 'str'})
+        fills = add_trades(btc)
+        # The split fill keeps string identifiers unique
+        self.assertEqual(list(fills['id'][2:4]), ['1002', '1002b'])
+        self.assertEqual(list(fills['orderId'][2:4]), ['2002', '2002b'])
+
+
+class SchemaTestCase(TestCase):
+
+    def test_preprocess_fills_typed(self):
+        raw = raw_fills().assign(clientOrderId=None)
+        spot, futures, futures_by_market, _ = preprocess_fills(raw)
+        self.assertEqual(futures['market'].dtype, 'category')
+        self.assertEqual(futures['side'].dtype, 'category')
+        self.assertEqual(futures['id'].dtype, 'int64')
+        self.assertEqual(futures['orderId'].dtype, 'Int64')
+        self.assertNotIn('clientOrderId', futures)
+        self.assertEqual(futures_by_market['BTC-PERP']['market'].dtype, 'category')
+        # Empty and non-empty histories share the declared time dtype
+        self.assertEqual(futures['time'].dtype, FILLS_SCHEMA['time'])
+        self.assertEqual(preprocess_fills(raw.iloc[:0])[1]['time'].dtype, FILLS_SCHEMA['time'])
+        # Input frame is left untouched
+        self.assertFalse(pd.api.types.is_datetime64_any_dtype(raw['time']))
+        self.assertIn('clientOrderId', raw)
+
+    def test_preprocess_fills_sorted_by_numeric_id(self):
+        raw = raw_fills({'BTC-PERP': [1, 1]})
+        raw['time'] = raw['time'].iloc[0]
+        raw['id'] = [1000, 999]
+        _, futures, _, _ = preprocess_fills(raw)
+        self.assertEqual(list(futures['id']), [999, 1000])
+
+
+class PrecisionTestCase(TestCase):
+
+    def test_convert_futures_size(self):
+        fills = pd.DataFrame({'market': ['UNISWAP-PERP', 'UNI-PERP', 'BTC-0626'], 'size': [1.23456, 1.23456, 1.23456]})
+        fills = convert_futures_size(fills)
+        # UNI is a substring of UNISWAP, each market must keep its own precision
+        self.assertEqual(list(fills['size']), [Decimal('1.2346'), Decimal('1.2'), Decimal('1.2346')])
+
+    def test_convert_futures_size_unknown(self):
+        fills = pd.DataFrame({'market': ['BTC-PERP', 'NEW-PERP', 'OTHER-0626'], 'size': [1.0, 1.0, 1.0]})
+        with self.assertRaisesRegex(KeyError, 'NEW, OTHER'):
+            convert_futures_size(fills)
+
+    def test_preprocess_fills_empty(self):
+        spot, futures, futures_by_market, spot_by_market = preprocess_fills(pd.DataFrame(columns=raw_fills().columns))
+        self.assertTrue(futures.empty)
+        self.assertEqual(futures_by_market, {})
+
+
+class MarketFramesTestCase(TestCase):
+
+    def test_market_frames(self):
+        fills = pd.DataFrame({'market': ['ETH-PERP', 'BTC-PERP', None, 'ETH-PERP', 'BTC-PERP'], 'size': [1.0, 2.0, 3.0, 4.0, 5.0]}, index=[10, 11, 12, 13, 14])
+        frames = MarketFrames(fills)
+        # Order of first appearance, rows without a market are left out
+        self.assertEqual(list(frames), ['ETH-PERP', 'BTC-PERP'])
+        self.assertEqual(len(frames), 2)
+        pd.testing.assert_frame_equal(frames['BTC-PERP'], fills[fills['market'] == 'BTC-PERP'])
+        self.assertNotIn('SOL-PERP', frames)
+        # Every market is a slice of one sorted frame
+        self.assertTrue(np.shares_memory(frames['BTC-PERP']['size'].to_numpy(), frames._frame['size'].to_numpy()))
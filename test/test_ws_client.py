@@ -0,0 +1,111 @@
+import json
+import time
+import asyncio
+from http import HTTPStatus
+from unittest import TestCase
+from unittest.mock import patch
+import websockets
+from ftx.clients.rest_client import FtxAuth, FtxClient, ApiError, PaginationInterrupted
+from ftx.clients.ws_client import FtxWebsocketClient
+
+
+def fill(id, second):
+    return {'id': id, 'market': 'BTC-PERP', 'future': 'BTC-PERP', 'size': 1.0, 'time': f'2020-01-01T00:00:{second:02d}+00:00'}
+
+
+# Local stand-in for the FTX websocket server
+# Every connection sends the given updates and is then dropped
+class StandInServer(object):
+
+    def __init__(self, connections, rejected=()):
+        self.connections = list(connections)
+        self.received = []
+        # Handshakes answered with a 503, counted from 1
+        self.rejected = set(rejected)
+        self.handshakes = 0
+
+    def process_request(self, connection, request):
+        self.handshakes += 1
+        if self.handshakes in self.rejected:
+            return connection.respond(HTTPStatus.SERVICE_UNAVAILABLE, 'Service Unavailable\n')
+
+    async def handler(self, ws):
+        messages = [json.loads(await ws.recv()) for _ in range(3)]
+        self.received.append(messages)
+        for message in self.connections.pop(0):
+            await ws.send(json.dumps(message))
+        if not self.connections:
+            await ws.wait_closed()
+
+
+def update(channel, data):
+    return {'channel': channel, 'type': 'update', 'data': data}
+
+
+class FtxWebsocketClientTestCase(TestCase):
+
+    def setUp(self):
+        self.client = FtxClient(FtxAuth('api-key', 'api-secret', 'sub'))
+
+    def run_client(self, server, count):
+        async def collect():
+            async with websockets.serve(server.handler, 'localhost', 0, process_request=server.process_request) as ws_server:
+                port = ws_server.sockets[0].getsockname()[1]
+                ws = FtxWebsocketClient(self.client, f'ws://localhost:{port}')
+                fills = []
+                async for f in ws.fills():
+                    fills.append(f)
+                    if len(fills) == count:
+                        break
+                return fills
+
+        with patch.object(FtxWebsocketClient, '_RECONNECT_DELAY', 0.01):
+            return asyncio.run(asyncio.wait_for(collect(), 5))
+
+    def test_auth_sign_ws_message(self):
+        with patch('time.time', return_value=1607195350.5327864):
+            message = json.loads(self.client.auth.sign_ws_message())
+        self.assertEqual(message['op'], 'login')
+        self.assertEqual(message['args']['key'], 'api-key')
+        self.assertEqual(message['args']['time'], 1607195350532)
+        self.assertEqual(message['args']['subaccount'], 'sub')
+        self.assertEqual(len(message['args']['sign']), 64)
+
+    # Fills missed while disconnected are backfilled over REST, without duplicates
+    @patch.object(FtxClient, 'get_all_fills')
+    def test_ws_client_reconnect_backfill(self, mock_client_get_all_fills):
+        mock_client_get_all_fills.return_value = [fill(3, 20), fill(2, 10)]
+        server = StandInServer([
+            [{'type': 'subscribed', 'channel': 'fills'}, update('fills', fill(1, 5)), update('fills', fill(2, 10))],
+            [update('fills', fill(3, 20)), update('fills', fill(4, 30))],
+        ])
+        fills = self.run_client(server, 4)
+        self.assertEqual([f['id'] for f in fills], [1, 2, 3, 4])
+        self.assertEqual(fills[0]['baseCurrency'], None)
+        mock_client_get_all_fills.assert_called_once_with(start_time=1577836810.0)
+        self.assertEqual([m['op'] for m in server.received[0]], ['login', 'subscribe', 'subscribe'])
+        self.assertEqual([m.get('channel') for m in server.received[1]], [None, 'fills', 'orders'])
+
+    # Fills made while reconnecting are backfilled even when none arrived on the first connection
+    @patch.object(FtxClient, 'get_all_fills')
+    def test_ws_client_reconnect_before_first_fill(self, mock_client_get_all_fills):
+        mock_client_get_all_fills.return_value = [fill(1, 5)]
+        server = StandInServer([[{'type': 'subscribed', 'channel': 'fills'}], [update('fills', fill(2, 10))]])
+        start = time.time()
+        fills = self.run_client(server, 2)
+        self.assertEqual([f['id'] for f in fills], [1, 2])
+        self.assertTrue(start <= mock_client_get_all_fills.call_args.kwargs['start_time'] <= time.time())
+
+    # Rejected handshakes and failed backfills are retried instead of ending the stream
+    @patch.object(FtxClient, 'get_all_fills')
+    def test_ws_client_rejected_handshake(self, mock_client_get_all_fills):
+        mock_client_get_all_fills.side_effect = [PaginationInterrupted('Pagination interrupted after 0 pages', None), []]
+        server = StandInServer([[update('fills', fill(1, 5))], [], [update('fills', fill(2, 10))]], rejected=[2])
+        fills = self.run_client(server, 2)
+        self.assertEqual([f['id'] for f in fills], [1, 2])
+        self.assertEqual(server.handshakes, 4)
+        self.assertEqual(mock_client_get_all_fills.call_count, 2)
+
+    def test_ws_client_error(self):
+        server = StandInServer([[{'type': 'error', 'code': 400, 'msg': 'Invalid login credentials'}]])
+        self.assertRaises(ApiError, self.run_client, server, 1)